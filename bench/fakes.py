@@ -0,0 +1,186 @@
+"""Just enough of discord.Interaction and friends to drive the command
+handlers without a gateway connection. Every call that would hit Discord's
+HTTP API sleeps `discord_latency` and is recorded instead."""
+import asyncio
+import itertools
+from types import SimpleNamespace
+from datetime import datetime, timezone
+
+_ids = itertools.count(1_000_000_000_000_000_000)
+
+
+def next_id():
+    return next(_ids)
+
+
+class FakeDiscord:
+    """Shared settings and counters for every fake object in a run."""
+
+    def __init__(self, latency=0.0, channel_create_latency=None):
+        self.latency = latency
+        self.channel_create_latency = latency if channel_create_latency is None else channel_create_latency
+        self.calls = {}
+
+    async def call(self, name, delay=None):
+        self.calls[name] = self.calls.get(name, 0) + 1
+        delay = self.latency if delay is None else delay
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+class FakeMessage:
+    def __init__(self, api, channel, content=None, embed=None, view=None):
+        self.api = api
+        self.id = next_id()
+        self.channel = channel
+        self.content = content
+        self.embed = embed
+        self.view = view
+        self.pinned = False
+
+    async def pin(self, reason=None):
+        await self.api.call("pin")
+        self.pinned = True
+
+    async def edit(self, **kwargs):
+        await self.api.call("edit_message")
+
+
+class FakeChannel:
+    def __init__(self, api, guild, name, category=None):
+        self.api = api
+        self.id = next_id()
+        self.guild = guild
+        self.name = name
+        self.category = category
+        self.mention = f"<#{self.id}>"
+        self.messages = []
+
+    async def send(self, content=None, embed=None, view=None, **kwargs):
+        await self.api.call("send")
+        message = FakeMessage(self.api, self, content, embed, view)
+        self.messages.append(message)
+        return message
+
+    def get_partial_message(self, message_id):
+        return next((m for m in self.messages if m.id == message_id), None)
+
+    async def delete(self, reason=None):
+        await self.api.call("delete_channel")
+        self.guild.channels.pop(self.id, None)
+
+
+class FakeRole:
+    def __init__(self, name):
+        self.id = next_id()
+        self.name = name
+        self.mention = f"<@&{self.id}>"
+
+
+class FakeGuild:
+    def __init__(self, api, name="Bench Guild"):
+        self.api = api
+        self.id = next_id()
+        self.name = name
+        self.channels = {}
+        self.roles = {}
+        self.icon = None
+
+    def get_channel(self, channel_id):
+        return self.channels.get(channel_id)
+
+    def get_role(self, role_id):
+        return self.roles.get(role_id)
+
+    def add_role(self, name):
+        role = FakeRole(name)
+        self.roles[role.id] = role
+        return role
+
+    async def create_text_channel(self, name, category=None, reason=None, **kwargs):
+        await self.api.call("create_channel", self.api.channel_create_latency)
+        channel = FakeChannel(self.api, self, name, category)
+        self.channels[channel.id] = channel
+        return channel
+
+
+class FakeMember:
+    def __init__(self, name=None, administrator=True, roles=()):
+        self.id = next_id()
+        self.name = name or f"user{self.id % 100000}"
+        self.display_name = self.name
+        self.mention = f"<@{self.id}>"
+        self.guild_permissions = SimpleNamespace(administrator=administrator)
+        self.roles = list(roles)
+
+
+class FakeResponse:
+    def __init__(self, interaction):
+        self.interaction = interaction
+        self._done = False
+
+    def is_done(self):
+        return self._done
+
+    async def _respond(self, name):
+        if self._done:
+            raise RuntimeError(f"Interaction already responded to ({name})")
+        await self.interaction.api.call(name)
+        self._done = True
+
+    async def defer(self, ephemeral=False, thinking=False):
+        await self._respond("defer")
+
+    async def send_message(self, content=None, **kwargs):
+        await self._respond("send_message")
+        self.interaction.sent.append((content, kwargs))
+
+    async def edit_message(self, **kwargs):
+        await self._respond("edit_original")
+        self.interaction.sent.append((kwargs.get("content"), kwargs))
+
+    async def send_modal(self, modal):
+        await self._respond("send_modal")
+        self.interaction.modal = modal
+
+
+class FakeFollowup:
+    def __init__(self, interaction):
+        self.interaction = interaction
+
+    async def send(self, content=None, **kwargs):
+        await self.interaction.api.call("followup")
+        self.interaction.sent.append((content, kwargs))
+        return FakeMessage(self.interaction.api, self.interaction.channel, content, kwargs.get("embed"), kwargs.get("view"))
+
+
+class FakeInteraction:
+    """What command, autocomplete, button and modal callbacks read from an
+    interaction. `sent` collects (content, kwargs) of everything sent back."""
+
+    def __init__(self, client, api, user, guild, channel=None, command=None):
+        self.id = next_id()
+        self.client = client
+        self.api = api
+        self.user = user
+        self.guild = guild
+        self.guild_id = guild.id if guild else None
+        self.channel = channel
+        self.command = command
+        self.created_at = datetime.now(timezone.utc)
+        self.extras = {}
+        self.sent = []
+        self.modal = None
+        self.response = FakeResponse(self)
+        self.followup = FakeFollowup(self)
+
+    async def edit_original_response(self, **kwargs):
+        await self.api.call("edit_original")
+        self.sent.append((kwargs.get("content"), kwargs))
+
+    def last_view(self):
+        """The view attached to the latest message sent, if any."""
+        for _, kwargs in reversed(self.sent):
+            if kwargs.get("view") is not None:
+                return kwargs["view"]
+        return None
@@ -0,0 +1,137 @@
+"""Local stand-in for the Clash of Clans API, serving the fixtures in
+bench/fixtures with configurable latency and injected 429s.
+
+Run it on its own and point the bot at it with COC_API_URL:
+
+    python -m bench.mock_api --port 8099 --latency 0.05 --rate-limit 0.02
+    COC_API_URL=http://127.0.0.1:8099/v1 python bot.py
+"""
+import json
+import random
+import asyncio
+import hashlib
+import argparse
+import pathlib
+from urllib.parse import unquote
+
+from aiohttp import web
+
+FIXTURES_DIR = pathlib.Path(__file__).parent / "fixtures"
+
+
+def load_fixture(name):
+    with open(FIXTURES_DIR / f"{name}.json", "r") as f:
+        return json.load(f)
+
+
+class MockApi:
+    """Serves /v1/players/{tag}, /v1/clans/{tag}, /v1/clans/{tag}/currentwar
+    and /v1/locations (the readiness probe).
+
+    Every tag is valid, and the fixture is returned with its tag (and clan
+    name) swapped, so distinct tags are distinct cache entries. Responses
+    carry Cache-Control and ETag like the real API. Tags starting with
+    "#INVALID" get a 404.
+    """
+
+    def __init__(self, latency=0.05, jitter=0.0, rate_limit=0.0, retry_after=1, max_age=60, seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_limit = rate_limit
+        self.retry_after = retry_after
+        self.max_age = max_age
+        self.random = random.Random(seed)
+        self.fixtures = {name: load_fixture(name) for name in ("player", "clan", "currentwar")}
+        self.requests = 0
+        self.throttled = 0
+        self.not_modified = 0
+        self._runner = None
+
+    def app(self):
+        app = web.Application()
+        app.router.add_get("/v1/players/{tag}", self.handle_player)
+        app.router.add_get("/v1/clans/{tag}", self.handle_clan)
+        app.router.add_get("/v1/clans/{tag}/currentwar", self.handle_war)
+        app.router.add_get("/v1/locations", self.handle_locations)
+        return app
+
+    async def start(self, host="127.0.0.1", port=0):
+        """Starts serving and returns the base URL to use as COC_API_URL."""
+        self._runner = web.AppRunner(self.app(), access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = self._runner.addresses[0][1]
+        return f"http://{host}:{port}/v1"
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def _respond(self, request, body):
+        self.requests += 1
+        delay = self.latency + self.random.uniform(0, self.jitter)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if self.random.random() < self.rate_limit:
+            self.throttled += 1
+            return web.json_response(
+                {"reason": "requestThrottled", "message": "Request was throttled, because amount of requests was above the threshold defined for the used API token."},
+                status=429,
+                headers={"Retry-After": str(self.retry_after)}
+            )
+        if body is None:
+            return web.json_response({"reason": "notFound"}, status=404)
+
+        payload = json.dumps(body).encode()
+        etag = '"' + hashlib.md5(payload).hexdigest() + '"'
+        headers = {"Cache-Control": f"public max-age={self.max_age}", "ETag": etag}
+        if request.headers.get("If-None-Match") == etag:
+            self.not_modified += 1
+            return web.Response(status=304, headers=headers)
+        return web.Response(body=payload, content_type="application/json", headers=headers)
+
+    def _tag(self, request):
+        tag = unquote(request.match_info["tag"]).upper()
+        return None if tag.startswith("#INVALID") else tag
+
+    async def handle_player(self, request):
+        tag = self._tag(request)
+        body = dict(self.fixtures["player"], tag=tag) if tag else None
+        return await self._respond(request, body)
+
+    async def handle_clan(self, request):
+        tag = self._tag(request)
+        body = dict(self.fixtures["clan"], tag=tag, name=f"Clan {tag}") if tag else None
+        return await self._respond(request, body)
+
+    async def handle_war(self, request):
+        tag = self._tag(request)
+        body = None
+        if tag:
+            war = self.fixtures["currentwar"]
+            body = dict(war, clan=dict(war["clan"], tag=tag, name=f"Clan {tag}"))
+        return await self._respond(request, body)
+
+    async def handle_locations(self, request):
+        body = {"items": [{"id": 32000006, "name": "International", "isCountry": False}], "paging": {"cursors": {}}}
+        return await self._respond(request, body)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock Clash of Clans API for offline benchmarks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds added to every response")
+    parser.add_argument("--jitter", type=float, default=0.0, help="extra random latency, up to this many seconds")
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="fraction of requests answered with 429")
+    parser.add_argument("--retry-after", type=int, default=1)
+    args = parser.parse_args()
+
+    api = MockApi(args.latency, args.jitter, args.rate_limit, args.retry_after)
+    web.run_app(api.app(), host=args.host, port=args.port, access_log=None)
+
+
+if __name__ == "__main__":
+    main()
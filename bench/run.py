@@ -0,0 +1,255 @@
+"""Offline benchmarks: the real command modules run against bench.mock_api
+and fake interactions, so no Discord connection or API token is needed.
+
+    python -m bench.run
+    python -m bench.run --workloads player,tickets --ops 500 --latency 0.1 --rate-limit 0.05
+    python -m bench.run --json bench_output.json
+
+Each workload reports throughput and p50/p95/p99 latency per operation.
+State files and the link database go to a temporary directory.
+"""
+import os
+import sys
+import json
+import math
+import time
+import random
+import asyncio
+import pathlib
+import argparse
+import tempfile
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import discord
+from discord.ext import commands
+
+from coc_api import CocClient
+from storage import LinkStore
+from bench.mock_api import MockApi
+from bench.fakes import FakeDiscord, FakeGuild, FakeMember, FakeInteraction
+
+EXTENSIONS = ["commands.players", "commands.clan", "commands.war", "commands.addclan", "ticket.ticket"]
+WORKLOADS = ("player", "autocomplete", "addclan", "tickets")
+
+
+class BenchBot(commands.Bot):
+    """Never logs in, it only carries the tree and what commands read from
+    interaction.client."""
+
+    def __init__(self, api_url, api_rate, db_path):
+        super().__init__(command_prefix="!", intents=discord.Intents.none())
+        self.coc = CocClient(token="bench", base_url=api_url, rate=api_rate, burst=int(api_rate))
+        self.links = LinkStore(db_path)
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    # Nearest-rank
+    index = max(0, min(len(sorted_values) - 1, math.ceil(len(sorted_values) * p / 100) - 1))
+    return sorted_values[index]
+
+
+async def measure(name, count, concurrency, op):
+    """Runs op(i) for i in range(count), at most `concurrency` at a time."""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = []
+
+    async def run(i):
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                await op(i)
+            except Exception as e:
+                errors.append(repr(e))
+                return
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(run(i) for i in range(count)))
+    wall = time.perf_counter() - start
+    latencies.sort()
+    result = {
+        "workload": name,
+        "ops": count,
+        "errors": len(errors),
+        "wall_s": wall,
+        "ops_per_s": count / wall if wall else 0.0,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+    }
+    if errors:
+        result["first_error"] = errors[0]
+    return result
+
+
+def autocomplete_callback(command, param):
+    # discord.py keeps the registered autocomplete on the command's parameter
+    return command._params[param].autocomplete
+
+
+class Bench:
+    def __init__(self, bot, api, args):
+        self.bot = bot
+        self.api = api
+        self.args = args
+        self.random = random.Random(args.seed)
+        self.guild = FakeGuild(api)
+        self.admin = FakeMember("admin", administrator=True)
+
+    def interaction(self, command=None, user=None):
+        return FakeInteraction(self.bot, self.api, user or self.admin, self.guild, command=command)
+
+    async def player(self, count):
+        command = self.bot.tree.get_command("player")
+        distinct = max(1, count // 4)
+
+        async def op(i):
+            interaction = self.interaction(command)
+            await command.callback(interaction, tag=f"#2PQ{i % distinct:05d}")
+            view = interaction.last_view()
+            if view is None:
+                raise RuntimeError(f"No profile view: {interaction.sent}")
+            for _ in range(self.args.toggles):
+                await view.unit_btn.callback(self.interaction())
+
+        return await measure("player+unit", count, self.args.concurrency, op)
+
+    async def autocomplete(self, count):
+        # Seed links so searches scan realistic lists
+        users = [FakeMember() for _ in range(20)]
+        for n in range(200):
+            await self.bot.links.add_clan(self.guild.id, f"#2C{n:05d}", f"Clan {n}")
+        for user in users:
+            for n in range(10):
+                await self.bot.links.add_player(user.id, f"#2U{user.id % 1000:03d}{n:02d}", f"Account {n}")
+        war = self.bot.tree.get_command("war")
+        player = self.bot.tree.get_command("player")
+        war_complete = autocomplete_callback(war, "tag")
+        player_complete = autocomplete_callback(player, "tag")
+        prefixes = ["", "2", "2c0", "clan 1", "#2C001", "acc", "9"]
+
+        async def op(i):
+            current = self.random.choice(prefixes)
+            if i % 2:
+                await war_complete(self.interaction(war), current)
+            else:
+                await player_complete(self.interaction(player, self.random.choice(users)), current)
+
+        return await measure("autocomplete", count, self.args.concurrency, op)
+
+    async def addclan(self, count):
+        command = self.bot.tree.get_command("addclan")
+        guild = self.guild = FakeGuild(self.api, "Addclan Guild")
+
+        async def op(i):
+            interaction = self.interaction(command)
+            await command.callback(interaction, tag=f"#2A{i:05d}")
+            content = interaction.sent[-1][0] if interaction.sent else ""
+            if not content.startswith("✅"):
+                raise RuntimeError(content)
+
+        result = await measure("addclan", count, self.args.concurrency, op)
+        if len(self.bot.links.clans_for_guild(guild.id)) != count - result["errors"]:
+            result["first_error"] = "link count does not match successful adds"
+        return result
+
+    async def tickets(self, count):
+        from ticket.ticket import TicketPanelView, staff_roles
+
+        guild = self.guild = FakeGuild(self.api, "Ticket Guild")
+        role = guild.add_role("Staff")
+        staff_roles.set(str(guild.id), {"staff_role": role.id})
+        panel = TicketPanelView()
+
+        async def op(i):
+            user = FakeMember(f"applicant{i}", administrator=False)
+            apply = self.interaction(user=user)
+            await panel.apply_now.callback(apply)
+            modal = apply.modal
+            # What Discord fills in from the submitted text field
+            modal.tag._value = f"#2T{i:05d}"
+            submit = self.interaction(user=user)
+            await modal.on_submit(submit)
+            confirm_view = submit.last_view()
+            if confirm_view is None:
+                raise RuntimeError(f"No confirm view: {submit.sent}")
+            await confirm_view.confirm_account.callback(self.interaction(user=user))
+
+        result = await measure("tickets", count, self.args.concurrency, op)
+        if len(guild.channels) != count - result["errors"]:
+            result["first_error"] = f"{len(guild.channels)} channels for {count - result['errors']} tickets"
+        return result
+
+
+def print_report(results, mock, discord_calls):
+    header = f"{'workload':<14}{'ops':>7}{'err':>6}{'ops/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        print(
+            f"{r['workload']:<14}{r['ops']:>7}{r['errors']:>6}{r['ops_per_s']:>10.1f}"
+            f"{r['p50_ms']:>10.1f}{r['p95_ms']:>10.1f}{r['p99_ms']:>10.1f}"
+        )
+        if "first_error" in r:
+            print(f"  first error: {r['first_error']}")
+    print(f"\nMock API: {mock.requests} requests, {mock.throttled} throttled, {mock.not_modified} not modified")
+    print("Discord calls: " + ", ".join(f"{name}={count}" for name, count in sorted(discord_calls.items())))
+
+
+async def main(args):
+    workdir = tempfile.mkdtemp(prefix="clashberry-bench-")
+    # Module-level state files (tickets.json etc.) are created relative to cwd
+    os.chdir(workdir)
+
+    mock = MockApi(args.latency, args.jitter, args.rate_limit, args.retry_after, seed=args.seed)
+    api_url = await mock.start()
+    bot = BenchBot(api_url, args.api_rate, os.path.join(workdir, "bench.db"))
+    for name in EXTENSIONS:
+        await bot.load_extension(name)
+    await bot.links.open()
+
+    api = FakeDiscord(args.discord_latency, args.channel_create_latency)
+    bench = Bench(bot, api, args)
+    results = []
+    try:
+        for workload in args.workloads.split(","):
+            if workload not in WORKLOADS:
+                raise SystemExit(f"Unknown workload {workload!r}, pick from {', '.join(WORKLOADS)}")
+            bot.coc.cache.clear()
+            results.append(await getattr(bench, workload)(args.ops))
+    finally:
+        await bot.coc.close()
+        await bot.links.close()
+        await mock.stop()
+
+    print_report(results, mock, api.calls)
+    if args.json:
+        with open(os.path.join(ROOT, args.json) if not os.path.isabs(args.json) else args.json, "w") as f:
+            json.dump({"args": vars(args), "results": results}, f, indent=2)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="ClashBerry offline benchmarks")
+    parser.add_argument("--workloads", default=",".join(WORKLOADS))
+    parser.add_argument("--ops", type=int, default=200, help="operations per workload")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--toggles", type=int, default=2, help="Unit button clicks per /player")
+    parser.add_argument("--latency", type=float, default=0.05, help="mock API latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.02)
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="fraction of API requests answered with 429")
+    parser.add_argument("--retry-after", type=int, default=1)
+    parser.add_argument("--api-rate", type=float, default=25, help="client token bucket, requests per second")
+    parser.add_argument("--discord-latency", type=float, default=0.0, help="simulated Discord HTTP latency")
+    parser.add_argument("--channel-create-latency", type=float, default=None)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="also write results to this file")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
@@ -1,61 +1,334 @@
 import os
+import sys
+import time
+# Taken before the heavy imports, so the startup time logged in on_ready is honest
+STARTED_AT = time.perf_counter()
 from dotenv import load_dotenv
 load_dotenv()
 import discord
+from discord import app_commands
 from discord.ext import commands
-import importlib.util
 import pathlib
+import hashlib
+import json
+import math
+import signal
+import asyncio
 
-from keep_alive import keep_alive
-keep_alive()
-
-from logger import log_guild_join  # ✅ Import the logging function
+from logger import GuildLogDigest
+from coc_api import CocClient
+from storage import LinkStore
+from persist import flush_all, atomic_write
+from war_poller import WarPoller
+from reminders import ReminderScheduler
+from metrics import Counter, Gauge, COMMAND_LATENCY, COMMANDS, monitor_loop_lag
+from watchdog import LoopWatchdog
+from health import HealthServer
 
 DISCORD_TOKEN = os.getenv("DISCORD_TOKEN")
+# Hash of the last synced command tree, so restarts skip tree.sync()
+COMMAND_HASH_FILE = "command_tree.sha256"
+FORCE_COMMAND_SYNC = os.getenv("FORCE_COMMAND_SYNC") == "1"
+
+# Sharding, set by launcher.py for each cluster process. SHARDED=1 alone runs
+# every shard Discord recommends in this one process.
+SHARD_COUNT = int(os.getenv("SHARD_COUNT", "0")) or None
+SHARD_IDS = [int(i) for i in os.getenv("SHARD_IDS", "").split(",") if i] or None
+SHARDED = os.getenv("SHARDED") == "1" or SHARD_IDS is not None
+CLUSTER_ID = int(os.getenv("CLUSTER_ID", "0"))
+CLUSTER_COUNT = int(os.getenv("CLUSTER_COUNT", "1"))
+# Seconds between shard heartbeats and cross-process link syncs
+HEALTH_INTERVAL = 30
+LINK_SYNC_INTERVAL = 2
+
+# Member caching. Commands only look at interaction.user, which comes with its
+# own roles and permissions in the interaction payload, so no mode needs the
+# member list. Startup time and RSS are logged on the first on_ready so modes
+# can be compared on the real guild set.
+#   none   - no members intent, no member cache, no chunking (default)
+#   joined - members intent, caches only members who join while running
+#   full   - members intent, every guild chunked at login (the old behaviour,
+#            minutes and gigabytes on large guilds)
+MEMBER_CACHE = os.getenv("MEMBER_CACHE", "none")
+
+# List all directories you want to load commands from
+COMMAND_DIRS = ["commands", "ticket"]
+
+def find_extensions():
+    """Extension names for every module in COMMAND_DIRS (e.g. ticket.ticket)."""
+    root = pathlib.Path(__file__).parent
+    names = []
+    for dir_name in COMMAND_DIRS:
+        for file in sorted((root / dir_name).glob("*.py")):
+            if not file.name.startswith("_"):
+                names.append(f"{dir_name}.{file.stem}")
+    return names
+
+def memory_usage_mb():
+    """Resident set size of this process in MB, None where it can't be read."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    # Peak rather than current RSS, in KB on Linux and bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024 if sys.platform == "darwin" else 1024)
 
 intents = discord.Intents.default()
 intents.guilds = True
-intents.members = True
+if MEMBER_CACHE not in ("none", "joined", "full"):
+    print(f"Unknown MEMBER_CACHE {MEMBER_CACHE!r}, using 'none'")
+    MEMBER_CACHE = "none"
+intents.members = MEMBER_CACHE != "none"
+if MEMBER_CACHE == "full":
+    member_cache_flags = discord.MemberCacheFlags.from_intents(intents)
+elif MEMBER_CACHE == "joined":
+    member_cache_flags = discord.MemberCacheFlags(voice=False, joined=True)
+else:
+    member_cache_flags = discord.MemberCacheFlags.none()
+
+def record_command(interaction, outcome):
+    started = interaction.extras.get("started")
+    if interaction.command is None or started is None:
+        return
+    name = interaction.command.qualified_name
+    COMMAND_LATENCY.observe(time.perf_counter() - started, name)
+    COMMANDS.inc(name, outcome)
+
+class ClashBerryTree(app_commands.CommandTree):
+    """Times every slash command for the /metrics endpoint."""
+
+    async def interaction_check(self, interaction):
+        interaction.extras["started"] = time.perf_counter()
+        return True
+
+    async def on_error(self, interaction, error):
+        record_command(interaction, "error")
+        await super().on_error(interaction, error)
+
+BaseBot = commands.AutoShardedBot if SHARDED else commands.Bot
+
+class ClashBerryBot(BaseBot):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        # One pooled Clash of Clans API client shared by every command
+        self.coc = CocClient()
+        # Clan/player links in SQLite, shared by every command module and
+        # by the other processes of a cluster
+        self.links = LinkStore(shared=CLUSTER_COUNT > 1)
+        # Live war embeds for every linked clan
+        self.war_poller = WarPoller(self)
+        # War attack reminders, scheduled from what the poller sees. The
+        # heap is per process, so each cluster keeps its own file.
+        reminders_file = f"war_reminders.{CLUSTER_ID}.json" if CLUSTER_COUNT > 1 else "war_reminders.json"
+        self.reminders = ReminderScheduler(self, reminders_file)
+        self.war_poller.listeners.append(self.reminders.on_war)
+        self._background = []
+        self.watchdog = None
+        # /healthz, /readyz, /status and /metrics on this loop
+        self.health = HealthServer(self)
+        # Guild join/leave digests for the log channel
+        self.guild_log = GuildLogDigest(self)
+        self.startup_logged = False
+        self._closing = False
+        self._shutdown = None
+
+    async def setup_hook(self):
+        # Runs once per process, unlike on_ready which fires on every reconnect
+        loop = asyncio.get_running_loop()
+        try:
+            # docker stop, platform restarts and launcher.py send SIGTERM, shut
+            # down through close() so pending state is flushed
+            loop.add_signal_handler(signal.SIGTERM, self._on_sigterm)
+        except NotImplementedError:  # Windows
+            pass
+        self.watchdog = LoopWatchdog(loop)
+        self.watchdog.start()
+        await self.health.start()
+        await self.load_command_modules()
+        await self.sync_commands()
+
+        # Loads the link store and builds the autocomplete indexes once
+        await self.links.open()
+        self.war_poller.start()
+        self.reminders.start()
+        self._background.append(asyncio.create_task(self._report_health()))
+        self._background.append(asyncio.create_task(monitor_loop_lag()))
+        if self.links.shared:
+            self._background.append(asyncio.create_task(self._sync_links()))
+
+    def _on_sigterm(self):
+        print("SIGTERM received, shutting down")
+        if self._shutdown is None:
+            self._shutdown = asyncio.create_task(self.close())
 
-bot = commands.Bot(
+    def shard_health(self):
+        """(shard_id, latency, guilds) for every shard this process runs."""
+        if SHARDED:
+            latencies = self.latencies
+        else:
+            latencies = [(self.shard_id or 0, self.latency)]
+        guilds = {}
+        for guild in self.guilds:
+            guilds[guild.shard_id] = guilds.get(guild.shard_id, 0) + 1
+        return [
+            (shard_id, latency if math.isfinite(latency) else None, guilds.get(shard_id, 0))
+            for shard_id, latency in latencies
+        ]
+
+    async def _report_health(self):
+        while True:
+            try:
+                await self.links.report_health(CLUSTER_ID, self.shard_health())
+            except Exception as e:
+                print(f"Could not report shard health: {e}")
+            await asyncio.sleep(HEALTH_INTERVAL)
+
+    async def _sync_links(self):
+        # Picks up /linkaccount and /addclan writes from the other clusters
+        while True:
+            await asyncio.sleep(LINK_SYNC_INTERVAL)
+            try:
+                await self.links.sync_changes()
+            except Exception as e:
+                print(f"Could not sync link changes: {e}")
+
+    async def load_command_modules(self):
+        """Loads every command module as an extension and reports load times."""
+        timings = []
+        for name in find_extensions():
+            start = time.perf_counter()
+            try:
+                await self.load_extension(name)
+            except commands.ExtensionError as e:
+                print(f"Failed to load {name}: {e}")
+                continue
+            timings.append((time.perf_counter() - start, name))
+        for elapsed, name in sorted(timings, reverse=True):
+            print(f"Loaded {name} in {elapsed * 1000:.1f}ms")
+        print(f"Loaded {len(timings)} modules in {sum(t for t, _ in timings) * 1000:.1f}ms")
+
+    async def reload_command_module(self, name):
+        """Hot-reloads one extension, or loads it if it's new, then resyncs."""
+        start = time.perf_counter()
+        if name in self.extensions:
+            await self.reload_extension(name)
+        else:
+            await self.load_extension(name)
+        elapsed = time.perf_counter() - start
+        await self.sync_commands()
+        return elapsed
+
+    async def sync_commands(self):
+        """Syncs the global command tree only if its definitions changed."""
+        if CLUSTER_ID != 0:
+            # Global commands are shared, the first cluster syncs them for all
+            return
+        missing = sorted(set(find_extensions()) - set(self.extensions))
+        if missing:
+            # Syncing now would unregister the failed modules' commands in every guild
+            print(f"Not syncing commands, failed to load {', '.join(missing)}")
+            return
+        payload = sorted(
+            (command.to_dict(self.tree) for command in self.tree.get_commands()),
+            key=lambda command: command["name"]
+        )
+        tree_hash = hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+        try:
+            with open(COMMAND_HASH_FILE, "r") as f:
+                synced_hash = f.read().strip()
+        except FileNotFoundError:
+            synced_hash = None
+        if tree_hash == synced_hash and not FORCE_COMMAND_SYNC:
+            print("Command tree unchanged, skipping sync")
+            return
+        await self.tree.sync()
+        atomic_write(COMMAND_HASH_FILE, tree_hash)
+        print(f"Synced {len(payload)} commands")
+
+    async def close(self):
+        if self._closing:
+            return
+        self._closing = True
+        for task in self._background:
+            task.cancel()
+        if self.watchdog is not None:
+            self.watchdog.stop()
+        await self.health.stop()
+        self.war_poller.stop()
+        self.reminders.stop()
+        await self.coc.close()
+        await self.links.close()
+        # Write out any debounced state changes before exiting
+        await flush_all()
+        # Post buffered guild joins/leaves while the connection is still up
+        await self.guild_log.flush()
+        await super().close()
+
+bot = ClashBerryBot(
     command_prefix="!",
     intents=intents,
+    member_cache_flags=member_cache_flags,
+    chunk_guilds_at_startup=MEMBER_CACHE == "full",
     activity=discord.Activity(
         type=discord.ActivityType.custom,
         name="Dating ArchQueen",
         state="Dating ArchQueen"
     ),
-    status=discord.Status.online
+    status=discord.Status.online,
+    tree_cls=ClashBerryTree,
+    shard_count=SHARD_COUNT,
+    **({"shard_ids": SHARD_IDS} if SHARD_IDS else {})
 )
 
-# List all directories you want to load commands from
-command_dirs = ["commands", "ticket"]
-for dir_name in command_dirs:
-    commands_dir = pathlib.Path(__file__).parent / dir_name
-    if not commands_dir.exists():
-        continue
-    for file in commands_dir.glob("*.py"):
-        if file.name.startswith("_"):
-            continue
-        # Module name includes directory for uniqueness (e.g. ticket.ticket)
-        module_name = f"{dir_name}.{file.stem}"
-        spec = importlib.util.spec_from_file_location(module_name, file)
-        module = importlib.util.module_from_spec(spec)
-        spec.loader.exec_module(module)
-        if hasattr(module, "setup"):
-            module.setup(bot)
+Gauge("clashberry_guilds", "Guilds this process is in", fn=lambda: len(bot.guilds))
+Gauge(
+    "clashberry_gateway_latency_seconds", "Heartbeat latency per shard", ("shard",),
+    fn=lambda: {(shard_id,): latency for shard_id, latency, _ in bot.shard_health()}
+)
+CACHE_COUNTERS = ("hits", "misses", "evictions")
+Gauge(
+    "clashberry_api_cache", "Clash of Clans API response cache size and hit ratio", ("stat",),
+    fn=lambda: {(stat,): value for stat, value in bot.coc.cache.stats().items() if stat not in CACHE_COUNTERS}
+)
+Counter(
+    "clashberry_api_cache_events_total", "Clash of Clans API response cache hits, misses and evictions", ("event",),
+    fn=lambda: {(stat,): value for stat, value in bot.coc.cache.stats().items() if stat in CACHE_COUNTERS}
+)
+Gauge("clashberry_api_queue_depth", "API requests waiting for a rate limit token", fn=lambda: bot.coc.scheduler.queue_depth)
+Counter("clashberry_api_shed_total", "API requests refused because the queue was full", fn=lambda: bot.coc.scheduler.shed)
 
 @bot.event
 async def on_ready():
-    # Always import the main view from the correct location
-    from ticket.ticket import TicketPanelView
-    bot.add_view(TicketPanelView())
-    await bot.tree.sync()
+    # Also fires after gateway reconnects, startup work lives in setup_hook
     print(f"Bot ready as {bot.user}")
+    if not bot.startup_logged:
+        bot.startup_logged = True
+        rss = memory_usage_mb()
+        print(
+            f"Startup took {time.perf_counter() - STARTED_AT:.1f}s with member cache '{MEMBER_CACHE}': "
+            f"{len(bot.guilds)} guilds, {sum(len(guild.members) for guild in bot.guilds)} cached members, "
+            f"RSS {f'{rss:.0f} MB' if rss is not None else 'unknown'}"
+        )
+
+@bot.event
+async def on_app_command_completion(interaction, command):
+    record_command(interaction, "ok")
 
 @bot.event
 async def on_guild_join(guild):
-    await log_guild_join(bot, guild)  # ✅ Call the logging function
+    bot.guild_log.guild_joined(guild)
+
+@bot.event
+async def on_guild_remove(guild):
+    bot.guild_log.guild_left(guild)
 
 if __name__ == "__main__":
     if not DISCORD_TOKEN:
@@ -0,0 +1,81 @@
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """Bounded in-memory cache: entries expire after their TTL and the least
+    recently used ones are evicted past the entry or byte cap."""
+
+    def __init__(self, max_entries=2000, max_bytes=64 * 1024 * 1024, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.clock = clock
+        self._entries = OrderedDict()  # key -> (value, size, expires_at)
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        entry = self._entries.get(key)
+        return entry is not None and entry[2] > self.clock()
+
+    def get(self, key, default=None):
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+        if entry[2] <= self.clock():
+            # Expired entries stay until evicted so peek() can revalidate them
+            self.misses += 1
+            return default
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def set(self, key, value, ttl, size=0):
+        if ttl <= 0 or size > self.max_bytes:
+            self.pop(key)
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (value, size, self.clock() + ttl)
+        self.bytes += size
+        while len(self._entries) > self.max_entries or self.bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def peek(self, key):
+        """Returns the value even if it has expired, without touching stats."""
+        entry = self._entries.get(key)
+        return None if entry is None else entry[0]
+
+    def pop(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        self._remove(key)
+        return entry[0]
+
+    def clear(self):
+        self._entries.clear()
+        self.bytes = 0
+
+    def _remove(self, key):
+        _, size, _ = self._entries.pop(key)
+        self.bytes -= size
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self.bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": self.hits / total if total else 0.0,
+        }
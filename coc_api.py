@@ -0,0 +1,228 @@
+import os
+import re
+import time
+import asyncio
+
+import aiohttp
+
+from cache import TTLCache
+from models import Player, Clan, War, approx_size
+from ratelimit import RequestScheduler, QueueFull, INTERACTIVE, BACKGROUND
+from metrics import API_LATENCY, API_RESPONSES
+
+COC_API_TOKEN = os.getenv("API_TOKEN")
+COC_API_URL = os.getenv("COC_API_URL", "https://cocproxy.royaleapi.dev/v1")
+
+# Connection pool settings, shared by every command and ticket modal
+COC_API_MAX_CONNECTIONS = int(os.getenv("COC_API_MAX_CONNECTIONS", "100"))
+COC_API_MAX_CONNECTIONS_PER_HOST = int(os.getenv("COC_API_MAX_CONNECTIONS_PER_HOST", "30"))
+COC_API_DNS_TTL = int(os.getenv("COC_API_DNS_TTL", "300"))
+COC_API_KEEPALIVE = float(os.getenv("COC_API_KEEPALIVE", "60"))
+COC_API_TIMEOUT = float(os.getenv("COC_API_TIMEOUT", "10"))
+
+# Response cache, keyed by endpoint and canonical tag
+COC_CACHE_MAX_ENTRIES = int(os.getenv("COC_CACHE_MAX_ENTRIES", "5000"))
+COC_CACHE_MAX_BYTES = int(os.getenv("COC_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+COC_CACHE_DEFAULT_TTL = float(os.getenv("COC_CACHE_DEFAULT_TTL", "60"))
+
+# Token bucket shared by every request, see ratelimit.RequestScheduler
+COC_API_RATE = float(os.getenv("COC_API_RATE", "25"))
+COC_API_BURST = int(os.getenv("COC_API_BURST", "25"))
+COC_API_MAX_QUEUE = int(os.getenv("COC_API_MAX_QUEUE", "200"))
+COC_API_MAX_RETRIES = int(os.getenv("COC_API_MAX_RETRIES", "2"))
+# Don't make a user wait out a long Retry-After, tell them to try again
+COC_API_MAX_RETRY_WAIT = float(os.getenv("COC_API_MAX_RETRY_WAIT", "5"))
+
+MAX_AGE_RE = re.compile(r"max-age=(\d+)")
+
+
+API_BUSY_MESSAGE = "😓 Clash of Clans API is busy right now, please try again in a moment."
+
+
+class ApiUnavailable(Exception):
+    """The API is throttling us or the request queue is full; not a bad tag."""
+
+
+def normalize_tag(tag):
+    tag = tag.replace(" ", "").upper().replace("O", "0")
+    if not tag.startswith("#"):
+        tag = "#" + tag
+    return tag
+
+
+def encode_tag(tag):
+    return tag.replace("#", "%23")
+
+
+def cache_ttl(headers):
+    cache_control = headers.get("Cache-Control", "")
+    if "no-store" in cache_control or "no-cache" in cache_control:
+        return 0
+    match = MAX_AGE_RE.search(cache_control)
+    if match:
+        return int(match.group(1))
+    return COC_CACHE_DEFAULT_TTL
+
+
+def retry_after(headers):
+    try:
+        return float(headers["Retry-After"])
+    except (KeyError, ValueError):
+        return None
+
+
+class CocClient:
+    """Bot-wide Clash of Clans API client that keeps one pooled session alive."""
+
+    def __init__(
+        self,
+        token=COC_API_TOKEN,
+        base_url=COC_API_URL,
+        limit=COC_API_MAX_CONNECTIONS,
+        limit_per_host=COC_API_MAX_CONNECTIONS_PER_HOST,
+        dns_ttl=COC_API_DNS_TTL,
+        keepalive_timeout=COC_API_KEEPALIVE,
+        timeout=COC_API_TIMEOUT,
+        cache_max_entries=COC_CACHE_MAX_ENTRIES,
+        cache_max_bytes=COC_CACHE_MAX_BYTES,
+        rate=COC_API_RATE,
+        burst=COC_API_BURST,
+        max_queue=COC_API_MAX_QUEUE,
+        max_retries=COC_API_MAX_RETRIES,
+    ):
+        self.token = token
+        self.base_url = base_url.rstrip("/")
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.dns_ttl = dns_ttl
+        self.keepalive_timeout = keepalive_timeout
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.cache = TTLCache(max_entries=cache_max_entries, max_bytes=cache_max_bytes)
+        self.scheduler = RequestScheduler(rate=rate, burst=burst, max_queue=max_queue)
+        self._session = None
+        # Monotonic time of the last answer that wasn't a 429/503, for ping()
+        self.last_ok = None
+        # (endpoint, tag, priority) -> task shared by every concurrent caller of that lookup
+        self._inflight = {}
+
+    def _get_session(self):
+        # Created lazily so it binds to the running event loop
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.limit,
+                limit_per_host=self.limit_per_host,
+                use_dns_cache=True,
+                ttl_dns_cache=self.dns_ttl,
+                keepalive_timeout=self.keepalive_timeout,
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                headers={
+                    "Authorization": f"Bearer {self.token}",
+                    "Accept": "application/json",
+                },
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+            )
+        return self._session
+
+    async def close(self):
+        for task in list(self._inflight.values()):
+            task.cancel()
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    async def _get(self, endpoint, tag, model, priority=INTERACTIVE):
+        tag = normalize_tag(tag)
+        key = (endpoint, tag)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached[0]
+
+        # Single-flight: identical concurrent lookups await one shared request.
+        # shield() keeps one caller's cancellation from cancelling it for the rest.
+        # Priority is part of the key so users never queue behind a background poll.
+        flight = (endpoint, tag, priority)
+        task = self._inflight.get(flight)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch(key, endpoint, tag, model, priority))
+            self._inflight[flight] = task
+            task.add_done_callback(lambda t: self._fetch_done(flight, t))
+        return await asyncio.shield(task)
+
+    def _fetch_done(self, key, task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Mark the error as retrieved even if every waiter was cancelled
+        if not task.cancelled():
+            task.exception()
+
+    async def _fetch(self, key, endpoint, tag, model, priority):
+        session = self._get_session()
+        path = endpoint.format(tag=encode_tag(tag))
+        for attempt in range(self.max_retries + 1):
+            try:
+                await self.scheduler.acquire(priority)
+            except QueueFull as e:
+                raise ApiUnavailable(str(e)) from e
+
+            # Revalidate an expired entry instead of downloading it again
+            stale = self.cache.peek(key)
+            headers = {"If-None-Match": stale[1]} if stale and stale[1] else None
+            start = time.perf_counter()
+            try:
+                async with session.get(f"{self.base_url}{path}", headers=headers) as resp:
+                    API_LATENCY.observe(time.perf_counter() - start, endpoint)
+                    API_RESPONSES.inc(endpoint, resp.status)
+                    if resp.status in (429, 503):
+                        wait = retry_after(resp.headers)
+                        self.scheduler.backoff(wait)
+                        if priority == INTERACTIVE and wait is not None and wait > COC_API_MAX_RETRY_WAIT:
+                            break
+                        continue
+                    self.scheduler.success()
+                    self.last_ok = time.monotonic()
+                    if resp.status == 304 and stale:
+                        self.cache.set(key, stale, cache_ttl(resp.headers), size=approx_size(stale[0]))
+                        return stale[0]
+                    if resp.status != 200:
+                        return None
+                    # Decoded straight into a slotted model, the raw payload isn't kept
+                    body = await resp.read()
+                    data = model.from_bytes(body)
+                    self.cache.set(key, (data, resp.headers.get("ETag")), cache_ttl(resp.headers), size=approx_size(data))
+                    return data
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                # Unreachable or too slow, callers answer with API_BUSY_MESSAGE
+                API_RESPONSES.inc(endpoint, "error")
+                raise ApiUnavailable(f"API request failed for {path}: {type(e).__name__}") from e
+        raise ApiUnavailable(f"API throttled {path}")
+
+    async def ping(self, max_age=60):
+        """True if the API answered within `max_age` seconds, or answers a
+        one-location probe now. Used by the readiness check."""
+        if self.last_ok is not None and time.monotonic() - self.last_ok < max_age:
+            return True
+        try:
+            await self.scheduler.acquire(BACKGROUND)
+        except QueueFull:
+            return False
+        try:
+            async with self._get_session().get(f"{self.base_url}/locations", params={"limit": 1}) as resp:
+                if resp.status != 200:
+                    return False
+        except Exception:
+            # Connection errors and timeouts alike mean not reachable
+            return False
+        self.last_ok = time.monotonic()
+        return True
+
+    async def get_player(self, player_tag, priority=INTERACTIVE):
+        return await self._get("/players/{tag}", player_tag, Player, priority)
+
+    async def get_clan(self, clan_tag, priority=INTERACTIVE):
+        return await self._get("/clans/{tag}", clan_tag, Clan, priority)
+
+    async def get_clan_war(self, clan_tag, priority=INTERACTIVE):
+        return await self._get("/clans/{tag}/currentwar", clan_tag, War, priority)
@@ -1,7 +1,7 @@
 import discord
 import os
 
-def setup(bot):
+async def setup(bot):
     @bot.tree.command(name="help", description="Get bot command details")
     async def help_command(interaction: discord.Interaction):
         embed = discord.Embed(
@@ -12,6 +12,8 @@ def setup(bot):
                 "**/addclan**\nLink a clan to this server.\n\n"
                 "**/linkaccount**\nLink your account to your Discord.\n\n"
                 "**/war**\nShow current war info for a clan.\n\n"
+                "**/warchannel**\nPost live war updates for linked clans in a channel.\n\n"
+                "**/warreminder**\nPing members with attacks left before war end.\n\n"
                 "**/removeclan**\nRemove a clan linked to this server.\n\n"
                 "**/setup_ticket**\nSetup the clan application ticket panel.\n\n"
                 "**/unlinkaccount**\nUnlink one of your linked accounts."
@@ -1,10 +1,15 @@
 import os
 import discord
-import aiohttp
-import json
 
-COC_API_TOKEN = os.getenv("API_TOKEN")
-LINKED_PLAYERS_FILE = "linked_players.json"
+from coc_api import ApiUnavailable, API_BUSY_MESSAGE
+from cache import TTLCache
+from models import approx_size
+from view_store import ViewStore
+from metrics import Gauge, track_autocomplete
+
+def category_table(*groups):
+    """name -> embed field name, so units are bucketed in a single pass."""
+    return {name: field for field, names in groups for name in names}
 
 class PlayerEmbeds:
     ELIXIR_TROOPS = [
@@ -46,150 +51,149 @@ class PlayerEmbeds:
         "Henchmen Puppet", "Dark Orb", "Metal Pants", "Vampstache", "Noble Iron"
     ]
 
+    TROOP_CATEGORIES = category_table(
+        ("Elixir Troops", ELIXIR_TROOPS),
+        ("Dark Troops", DARK_TROOPS),
+        ("Super Troops", SUPER_TROOPS),
+        ("Siege Machines", SIEGE_MACHINES),
+        ("Pets", PETS),
+    )
+    SPELL_CATEGORIES = category_table(
+        ("Elixir Spells", ELIXIR_SPELLS),
+        ("Dark Spells", DARK_SPELLS),
+    )
+    HERO_EQUIPMENT = frozenset(HERO_EQUIPMENT_NAMES)
+    UNIT_FIELDS = (
+        "Elixir Troops", "Dark Troops", "Super Troops", "Elixir Spells", "Dark Spells",
+        "Siege Machines", "Pets", "Heroes", "Hero Equipment"
+    )
+
     @staticmethod
-    def player_info(player_data):
+    def player_info(player):
         embed = discord.Embed(
-            title=f"{player_data.get('name', '?')} ({player_data.get('tag', '?')})",
+            title=f"{player.name} ({player.tag})",
             color=discord.Color.green()
         )
-        embed.add_field(name="Town Hall", value=player_data.get("townHallLevel", "?"))
-        embed.add_field(name="Exp Level", value=player_data.get("expLevel", "?"))
-        embed.add_field(name="Trophies", value=player_data.get("trophies", "?"))
-        embed.add_field(name="Clan", value=player_data.get("clan", {}).get("name", "None"))
-        league = player_data.get("league", {}).get("name")
-        if league:
-            embed.add_field(name="League", value=league)
-        icon = player_data.get("league", {}).get("iconUrls", {}).get("medium")
-        if icon:
-            embed.set_thumbnail(url=icon)
+        embed.add_field(name="Town Hall", value=player.town_hall)
+        embed.add_field(name="Exp Level", value=player.exp_level)
+        embed.add_field(name="Trophies", value=player.trophies)
+        embed.add_field(name="Clan", value=player.clan_name)
+        if player.league_name:
+            embed.add_field(name="League", value=player.league_name)
+        if player.league_icon:
+            embed.set_thumbnail(url=player.league_icon)
         embed.set_footer(text="Click 'Unit' button for more information.")
         return embed
 
     @staticmethod
-    def unit_embed(player_data):
-        troops = player_data.get("troops", [])
-        spells = player_data.get("spells", [])
-        heroes = player_data.get("heroes", [])
-        hero_equipment = player_data.get("heroEquipment", [])
-
-        def troop_lines(names):
-            return "\n".join(
-                f"{t['name']}: {t['level']}/{t['maxLevel']}" for t in troops if t.get("name") in names
-            ) or "None"
-
-        def spell_lines(names):
-            return "\n".join(
-                f"{s['name']}: {s['level']}/{s['maxLevel']}" for s in spells if s.get("name") in names
-            ) or "None"
-
-        def pet_lines():
-            return "\n".join(
-                f"{t['name']}: {t['level']}/{t['maxLevel']}" for t in troops if t.get("name") in PlayerEmbeds.PETS
-            ) or "None"
-
-        def siege_lines():
-            return "\n".join(
-                f"{t['name']}: {t['level']}/{t['maxLevel']}" for t in troops if t.get("name") in PlayerEmbeds.SIEGE_MACHINES
-            ) or "None"
-
-        def hero_lines():
-            return "\n".join(
-                f"{h['name']}: {h['level']}/{h['maxLevel']}" for h in heroes
-            ) or "None"
-
-        def equipment_lines():
-            if hero_equipment:
-                result = "\n".join(
-                    f"{eq['name']}: {eq.get('level', '?')}/{eq.get('maxLevel', '?')}"
-                    for eq in hero_equipment if eq.get("name") in PlayerEmbeds.HERO_EQUIPMENT_NAMES
-                )
-                if result:
-                    return result
-            return "None"
+    def unit_embed(player):
+        buckets = {field: [] for field in PlayerEmbeds.UNIT_FIELDS}
+        for t in player.troops:
+            field = PlayerEmbeds.TROOP_CATEGORIES.get(t.name)
+            if field:
+                buckets[field].append(f"{t.name}: {t.level}/{t.max_level}")
+        for s in player.spells:
+            field = PlayerEmbeds.SPELL_CATEGORIES.get(s.name)
+            if field:
+                buckets[field].append(f"{s.name}: {s.level}/{s.max_level}")
+        for h in player.heroes:
+            buckets["Heroes"].append(f"{h.name}: {h.level}/{h.max_level}")
+        for eq in player.hero_equipment:
+            if eq.name in PlayerEmbeds.HERO_EQUIPMENT:
+                buckets["Hero Equipment"].append(f"{eq.name}: {eq.level}/{eq.max_level}")
 
         embed = discord.Embed(
             title="Army Overview",
             color=discord.Color.blurple()
         )
-        embed.add_field(name="Elixir Troops", value=troop_lines(PlayerEmbeds.ELIXIR_TROOPS), inline=False)
-        embed.add_field(name="Dark Troops", value=troop_lines(PlayerEmbeds.DARK_TROOPS), inline=False)
-        embed.add_field(name="Super Troops", value=troop_lines(PlayerEmbeds.SUPER_TROOPS), inline=False)
-        embed.add_field(name="Elixir Spells", value=spell_lines(PlayerEmbeds.ELIXIR_SPELLS), inline=False)
-        embed.add_field(name="Dark Spells", value=spell_lines(PlayerEmbeds.DARK_SPELLS), inline=False)
-        embed.add_field(name="Siege Machines", value=siege_lines(), inline=False)
-        embed.add_field(name="Pets", value=pet_lines(), inline=False)
-        embed.add_field(name="Heroes", value=hero_lines(), inline=False)
-        embed.add_field(name="Hero Equipment", value=equipment_lines(), inline=False)
+        for field in PlayerEmbeds.UNIT_FIELDS:
+            embed.add_field(name=field, value="\n".join(buckets[field]) or "None", inline=False)
         embed.set_footer(text="Click 'Back' to return to profile.")
         return embed
 
-async def get_coc_player(player_tag):
-    url = f"https://cocproxy.royaleapi.dev/v1/players/{player_tag.replace('#', '%23')}"
-    headers = {"Authorization": f"Bearer {COC_API_TOKEN}"}
-    async with aiohttp.ClientSession() as session:
-        async with session.get(url, headers=headers) as resp:
-            if resp.status == 200:
-                return await resp.json()
-            return None
-
-def load_linked_players():
-    try:
-        with open(LINKED_PLAYERS_FILE, "r") as f:
-            return json.load(f)
-    except Exception:
-        return {}
+# Rendered embeds keyed by (kind, player tag, Player.fingerprint), so
+# toggling Unit/Back on a profile doesn't rebuild them
+embed_cache = TTLCache(max_entries=int(os.getenv("PLAYER_EMBED_CACHE_MAX", "1000")))
+EMBED_CACHE_TTL = float(os.getenv("PLAYER_EMBED_CACHE_TTL", "900"))
+
+def cached_embed(kind, player):
+    key = (kind, player.tag, player.fingerprint)
+    embed = embed_cache.get(key)
+    if embed is None:
+        if kind == "unit":
+            embed = PlayerEmbeds.unit_embed(player)
+        else:
+            embed = PlayerEmbeds.player_info(player)
+        embed_cache.set(key, embed, EMBED_CACHE_TTL)
+    return embed
+
+PROFILE_VIEW_TIMEOUT = float(os.getenv("PROFILE_VIEW_TIMEOUT", "900"))
+profile_views = ViewStore(
+    max_views=int(os.getenv("PROFILE_VIEW_MAX", "500")),
+    max_bytes=int(os.getenv("PROFILE_VIEW_MAX_BYTES", str(16 * 1024 * 1024)))
+)
+Gauge("clashberry_live_views", "Profile views still listening for clicks", fn=lambda: profile_views.live)
 
 class ProfileButtonView(discord.ui.View):
-    def __init__(self, player_data, show_unit=False):
-        super().__init__(timeout=None)
-        self.player_data = player_data
+    def __init__(self, player, show_unit=False):
+        super().__init__(timeout=PROFILE_VIEW_TIMEOUT)
+        # A slotted Player model, not the raw payload
+        self.player = player
         self.show_unit = show_unit
 
         # Toggle button
-        label = "Back" if self.show_unit else "Unit"
-        self.unit_btn = discord.ui.Button(label=label, style=discord.ButtonStyle.primary, custom_id="unit_btn")
+        self.unit_btn = discord.ui.Button(label=self.toggle_label(), style=discord.ButtonStyle.primary, custom_id="unit_btn")
         self.unit_btn.callback = self.unit_btn_callback
         self.add_item(self.unit_btn)
 
         # Open In-game link button
-        tag = player_data.get("tag", "").replace("#", "")
-        if tag:
+        tag = player.tag.replace("#", "")
+        if tag and tag != "?":
             url = f"https://link.clashofclans.com/?action=OpenPlayerProfile&tag=%23{tag}"
             self.add_item(discord.ui.Button(label="Open In-game", url=url, style=discord.ButtonStyle.link))
 
+        profile_views.add(self, approx_size(player))
+
+    def toggle_label(self):
+        return "Back" if self.show_unit else "Unit"
+
     async def unit_btn_callback(self, interaction: discord.Interaction):
+        # Reuse this view, only the button label changes
         self.show_unit = not self.show_unit
-        new_view = ProfileButtonView(self.player_data, show_unit=self.show_unit)
-        if self.show_unit:
-            embed = PlayerEmbeds.unit_embed(self.player_data)
-        else:
-            embed = PlayerEmbeds.player_info(self.player_data)
-        await interaction.response.edit_message(embed=embed, view=new_view)
+        self.unit_btn.label = self.toggle_label()
+        profile_views.touch(self)
+        embed = cached_embed("unit" if self.show_unit else "info", self.player)
+        await interaction.response.edit_message(embed=embed, view=self)
 
-def setup(bot):
+    async def on_timeout(self):
+        profile_views.discard(self)
+
+async def setup(bot):
+    @track_autocomplete
     async def player_tag_autocomplete(interaction: discord.Interaction, current: str):
-        data = load_linked_players()
-        user_id = str(interaction.user.id)
-        accounts = data.get(user_id, [])
+        accounts = interaction.client.links.players.search(interaction.user.id, current)
         return [
             discord.app_commands.Choice(
                 name=f"{acc['name']} ({acc['tag']})",
                 value=acc['tag']
             )
             for acc in accounts
-            if current.lower() in acc['tag'].lower() or current.lower() in acc['name'].lower()
-        ][:25]
+        ]
 
     @bot.tree.command(name="player", description="Get player information")
     @discord.app_commands.describe(tag="e.g. #2Q82LRL")
     @discord.app_commands.autocomplete(tag=player_tag_autocomplete)
     async def player_command(interaction: discord.Interaction, tag: str):
         await interaction.response.defer()
-        player_data = await get_coc_player(tag)
-        if not player_data:
+        try:
+            player = await interaction.client.coc.get_player(tag)
+        except ApiUnavailable:
+            await interaction.followup.send(API_BUSY_MESSAGE)
+            return
+        if not player:
             await interaction.followup.send("😓 Invalid player tag.",)
             return
 
-        view = ProfileButtonView(player_data, show_unit=False)
-        embed = PlayerEmbeds.player_info(player_data)
+        view = ProfileButtonView(player, show_unit=False)
+        embed = cached_embed("info", player)
         await interaction.followup.send(embed=embed, view=view, ephemeral=True)
\ No newline at end of file
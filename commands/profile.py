@@ -0,0 +1,39 @@
+import io
+import time
+import asyncio
+import discord
+
+from watchdog import SamplingProfiler
+
+MAX_PROFILE_SECONDS = 60
+# One profile at a time, two samplers would only measure each other
+profile_lock = asyncio.Lock()
+
+async def setup(bot):
+    @bot.tree.command(name="profile", description="Profile the bot's event loop (bot owner only).")
+    @discord.app_commands.describe(seconds=f"How long to sample, 1-{MAX_PROFILE_SECONDS}")
+    async def profile_command(interaction: discord.Interaction, seconds: discord.app_commands.Range[int, 1, MAX_PROFILE_SECONDS] = 10):
+        if not await interaction.client.is_owner(interaction.user):
+            await interaction.response.send_message("😓 Only the bot owner can use this command.", ephemeral=True)
+            return
+        if profile_lock.locked():
+            await interaction.response.send_message("😓 A profile is already running.", ephemeral=True)
+            return
+
+        await interaction.response.defer(ephemeral=True, thinking=True)
+        async with profile_lock:
+            profiler = SamplingProfiler(interaction.client.watchdog.thread_id)
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, profiler.run, seconds)
+
+        top = "\n".join(f"`{count:>5}` {function}" for function, count in profiler.top_functions())
+        file = discord.File(
+            io.BytesIO(profiler.collapsed().encode()),
+            filename=f"profile-{int(time.time())}.folded"
+        )
+        await interaction.followup.send(
+            f"✅ {profiler.samples} samples over {seconds}s. Open the file with speedscope or flamegraph.pl.\n"
+            f"Most sampled functions:\n{top or 'none'}",
+            file=file,
+            ephemeral=True
+        )
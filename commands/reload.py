@@ -0,0 +1,27 @@
+import discord
+from discord.ext import commands
+
+async def setup(bot):
+    async def module_autocomplete(interaction: discord.Interaction, current: str):
+        names = sorted(interaction.client.extensions)
+        return [
+            discord.app_commands.Choice(name=name, value=name)
+            for name in names
+            if current.lower() in name.lower()
+        ][:25]
+
+    @bot.tree.command(name="reload", description="Reload a command module (bot owner only).")
+    @discord.app_commands.describe(module="e.g. commands.players")
+    @discord.app_commands.autocomplete(module=module_autocomplete)
+    async def reload_command(interaction: discord.Interaction, module: str):
+        if not await interaction.client.is_owner(interaction.user):
+            await interaction.response.send_message("😓 Only the bot owner can use this command.", ephemeral=True)
+            return
+
+        await interaction.response.defer(ephemeral=True, thinking=True)
+        try:
+            elapsed = await interaction.client.reload_command_module(module)
+        except commands.ExtensionError as e:
+            await interaction.followup.send(f"😓 Could not reload `{module}`: {e}", ephemeral=True)
+            return
+        await interaction.followup.send(f"✅ Reloaded `{module}` in {elapsed * 1000:.1f}ms.", ephemeral=True)
@@ -1,63 +1,97 @@
-import os
 import discord
-import aiohttp
-import json
-
-COC_API_TOKEN = os.getenv("API_TOKEN")
-LINKED_CLANS_FILE = "linked_clans.json"
-
-async def get_coc_clan_war(clan_tag):
-    url = f"https://cocproxy.royaleapi.dev/v1/clans/{clan_tag.replace('#', '%23')}/currentwar"
-    headers = {"Authorization": f"Bearer {COC_API_TOKEN}"}
-    async with aiohttp.ClientSession() as session:
-        async with session.get(url, headers=headers) as resp:
-            if resp.status == 200:
-                return await resp.json()
-            return None
-
-def load_linked_clans():
-    try:
-        with open(LINKED_CLANS_FILE, "r") as f:
-            return json.load(f)
-    except Exception:
-        return {}
-
-def setup(bot):
+
+from coc_api import ApiUnavailable, API_BUSY_MESSAGE
+from war_poller import war_channels
+from reminders import reminder_settings
+from metrics import track_autocomplete
+
+def war_embed(war):
+    clan = war.clan
+    opponent = war.opponent
+    embed = discord.Embed(
+        title=f"War: {clan.name} vs {opponent.name}",
+        color=discord.Color.red(),
+    )
+    embed.add_field(name="Our Stars", value=clan.stars)
+    embed.add_field(name="Our Attacks", value=clan.attacks)
+    embed.add_field(name="Our Destruction", value=f"{clan.destruction}%")
+    embed.add_field(name="Opponent Stars", value=opponent.stars)
+    embed.add_field(name="Opponent Attacks", value=opponent.attacks)
+    embed.add_field(name="Opponent Destruction", value=f"{opponent.destruction}%")
+    embed.add_field(name="State", value=war.state)
+    embed.add_field(name="Team Size", value=war.team_size)
+    return embed
+
+async def setup(bot):
+    @track_autocomplete
     async def clan_tag_autocomplete(interaction: discord.Interaction, current: str):
-        data = load_linked_clans()
-        guild_id = str(interaction.guild.id)
-        clans = data.get(guild_id, [])
+        clans = interaction.client.links.clans.search(interaction.guild.id, current)
         return [
             discord.app_commands.Choice(
                 name=f"{clan['name']} ({clan['tag']})",
                 value=clan['tag']
             )
             for clan in clans
-            if current.lower() in clan['tag'].lower() or current.lower() in clan['name'].lower()
-        ][:25]
+        ]
 
     @bot.tree.command(name="war", description="Get clan war information.")
     @discord.app_commands.describe(tag="e.g. #2Q82LRL")
     @discord.app_commands.autocomplete(tag=clan_tag_autocomplete)
     async def war_command(interaction: discord.Interaction, tag: str):
         await interaction.response.defer()
-        war_data = await get_coc_clan_war(tag)
-        if not war_data or war_data.get("state") == "notInWar":
+        try:
+            war = await interaction.client.coc.get_clan_war(tag)
+        except ApiUnavailable:
+            await interaction.followup.send(API_BUSY_MESSAGE)
+            return
+        if not war or war.state == "notInWar":
             await interaction.followup.send("😓 No current war found for this clan.")
             return
 
-        clan = war_data.get("clan", {})
-        opponent = war_data.get("opponent", {})
-        embed = discord.Embed(
-            title=f"War: {clan.get('name', '?')} vs {opponent.get('name', '?')}",
-            color=discord.Color.red(),
+        await interaction.followup.send(embed=war_embed(war))
+
+    @bot.tree.command(name="warchannel", description="Post live war updates for linked clans in a channel.")
+    @discord.app_commands.describe(channel="Channel for live war updates (leave empty to turn them off)")
+    async def warchannel_command(interaction: discord.Interaction, channel: discord.TextChannel = None):
+        # Admin check
+        if not interaction.user.guild_permissions.administrator:
+            await interaction.response.send_message("😓 You don't have admin permission to use this command.", ephemeral=True)
+            return
+
+        guild_id = str(interaction.guild.id)
+        if channel is None:
+            war_channels.pop(guild_id)
+            await interaction.response.send_message("✅ Live war updates turned off.", ephemeral=True)
+            return
+        war_channels.set(guild_id, channel.id)
+        await interaction.response.send_message(
+            f"✅ Live war updates for linked clans will be posted in {channel.mention}.", ephemeral=True
+        )
+
+    @bot.tree.command(name="warreminder", description="Remind linked members with attacks left before war end.")
+    @discord.app_commands.describe(hours="Hours before war end, e.g. 4,1 (leave empty to turn reminders off)")
+    async def warreminder_command(interaction: discord.Interaction, hours: str = None):
+        # Admin check
+        if not interaction.user.guild_permissions.administrator:
+            await interaction.response.send_message("😓 You don't have admin permission to use this command.", ephemeral=True)
+            return
+
+        guild_id = str(interaction.guild.id)
+        if not hours:
+            reminder_settings.pop(guild_id)
+            await interaction.response.send_message("✅ War reminders turned off.", ephemeral=True)
+            return
+        try:
+            values = sorted({int(h) for h in hours.replace(" ", "").split(",") if h}, reverse=True)
+        except ValueError:
+            values = []
+        if not values or any(h < 1 or h > 23 for h in values):
+            await interaction.response.send_message("😓 Please give hours between 1 and 23, e.g. `4,1`.", ephemeral=True)
+            return
+        reminder_settings.set(guild_id, values)
+        channel_id = war_channels.get(guild_id)
+        where = f"<#{channel_id}>" if channel_id else "the war channel (set one with /warchannel)"
+        await interaction.response.send_message(
+            f"✅ Members with attacks left will be pinged {', '.join(f'{h}h' for h in values)} before war end in {where}.",
+            ephemeral=True
         )
-        embed.add_field(name="Our Stars", value=clan.get("stars", "?"))
-        embed.add_field(name="Our Attacks", value=clan.get("attacks", 0))
-        embed.add_field(name="Our Destruction", value=f"{clan.get('destructionPercentage', 0)}%")
-        embed.add_field(name="Opponent Stars", value=opponent.get("stars", "?"))
-        embed.add_field(name="Opponent Attacks", value=opponent.get("attacks", 0))
-        embed.add_field(name="Opponent Destruction", value=f"{opponent.get('destructionPercentage', 0)}%")
-        embed.add_field(name="State", value=war_data.get("state", "?"))
-        embed.add_field(name="Team Size", value=war_data.get("teamSize", "?"))
-        await interaction.followup.send(embed=embed)
\ No newline at end of file
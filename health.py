@@ -0,0 +1,96 @@
+import os
+import time
+
+from aiohttp import web
+
+import metrics
+
+# Each cluster process (see launcher.py) gets its own port
+HEALTH_PORT = int(os.getenv("PORT", "8080")) + int(os.getenv("CLUSTER_ID", "0"))
+HEALTH_HOST = os.getenv("HEALTH_HOST", "0.0.0.0")
+# A shard slower than this to heartbeat isn't ready to serve commands
+READY_MAX_LATENCY = float(os.getenv("READY_MAX_LATENCY", "10"))
+
+
+class HealthServer:
+    """HTTP endpoints for the orchestrator, served on the bot's own event loop.
+
+    /healthz  the process is up and the loop answers
+    /readyz   gateway connected, every shard heartbeating and the API reachable
+    /status   JSON summary of shards, caches and background work
+    /metrics  Prometheus text, see metrics.py
+    """
+
+    def __init__(self, bot, host=HEALTH_HOST, port=HEALTH_PORT):
+        self.bot = bot
+        self.host = host
+        self.port = port
+        self.started_at = time.time()
+        self._runner = None
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get("/", self.healthz)
+        app.router.add_get("/healthz", self.healthz)
+        app.router.add_get("/readyz", self.readyz)
+        app.router.add_get("/status", self.status)
+        app.router.add_get("/metrics", self.metrics_endpoint)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        print(f"Health server listening on {self.host}:{self.port}")
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def healthz(self, request):
+        return web.Response(text="ClashBerry is alive!")
+
+    async def readyz(self, request):
+        shards = self.bot.shard_health()
+        checks = {
+            "gateway": self.bot.is_ready() and not self.bot.is_closed(),
+            "shards": bool(shards) and all(
+                latency is not None and latency < READY_MAX_LATENCY for _, latency, _ in shards
+            ),
+            "api": await self.bot.coc.ping(),
+        }
+        body = {
+            "ready": all(checks.values()),
+            "checks": checks,
+            "shards": {str(shard_id): latency for shard_id, latency, _ in shards},
+        }
+        return web.json_response(body, status=200 if body["ready"] else 503)
+
+    async def status(self, request):
+        bot = self.bot
+        body = {
+            "user": str(bot.user) if bot.user else None,
+            "ready": bot.is_ready(),
+            "uptime_s": round(time.time() - self.started_at),
+            "guilds": len(bot.guilds),
+            "shards": [
+                {"id": shard_id, "latency_s": latency, "guilds": guilds}
+                for shard_id, latency, guilds in bot.shard_health()
+            ],
+            "loop_lag_s": metrics.LOOP_LAG.get(),
+            "extensions": sorted(bot.extensions),
+            "links": {"clans": len(bot.links.clans), "players": len(bot.links.players)},
+            "api": {
+                "cache": bot.coc.cache.stats(),
+                "queue_depth": bot.coc.scheduler.queue_depth,
+                "shed": bot.coc.scheduler.shed,
+                "rate": bot.coc.scheduler.rate,
+            },
+            "war_poller": {"polls": bot.war_poller.polls, "updates": bot.war_poller.updates},
+            "reminders": {"pending": bot.reminders.pending, "sent": bot.reminders.sent},
+        }
+        return web.json_response(body)
+
+    async def metrics_endpoint(self, request):
+        return web.Response(
+            text=metrics.render(),
+            headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"}
+        )
@@ -0,0 +1,172 @@
+import os
+import sys
+import time
+import json
+import signal
+import sqlite3
+import subprocess
+import urllib.request
+from dotenv import load_dotenv
+load_dotenv()
+
+from storage import DATABASE_FILE
+
+DISCORD_TOKEN = os.getenv("DISCORD_TOKEN")
+# Total shards, 0 asks Discord for its recommended count
+SHARD_COUNT = int(os.getenv("SHARD_COUNT", "0"))
+# One process per core by default, each running a contiguous range of shards
+CLUSTER_COUNT = int(os.getenv("CLUSTER_COUNT", "0"))
+# A shard whose heartbeat is older than this gets its cluster restarted
+HEALTH_TIMEOUT = float(os.getenv("SHARD_HEALTH_TIMEOUT", "120"))
+CHECK_INTERVAL = 10
+# Longest wait between restarts of a cluster that keeps crashing
+MAX_RESTART_DELAY = 300
+
+# Budgets every process would otherwise claim in full, split evenly instead
+SHARED_BUDGETS = {
+    "COC_API_RATE": "25",
+    "COC_API_BURST": "25",
+    "COC_API_MAX_QUEUE": "200",
+    "WAR_POLL_RATE": "5",
+}
+
+
+def recommended_shards(token):
+    request = urllib.request.Request(
+        "https://discord.com/api/v10/gateway/bot",
+        headers={"Authorization": f"Bot {token}", "User-Agent": "ClashBerry launcher"}
+    )
+    with urllib.request.urlopen(request, timeout=10) as response:
+        return json.load(response)["shards"]
+
+
+def shard_ranges(shard_count, cluster_count):
+    """Splits shards 0..shard_count-1 into cluster_count contiguous ranges."""
+    size, extra = divmod(shard_count, cluster_count)
+    ranges, start = [], 0
+    for cluster_id in range(cluster_count):
+        end = start + size + (1 if cluster_id < extra else 0)
+        ranges.append(list(range(start, end)))
+        start = end
+    return ranges
+
+
+class Cluster:
+    def __init__(self, cluster_id, shard_ids, shard_count, cluster_count):
+        self.cluster_id = cluster_id
+        self.shard_ids = shard_ids
+        self.env = dict(os.environ)
+        self.env.update({
+            "SHARD_COUNT": str(shard_count),
+            "SHARD_IDS": ",".join(map(str, shard_ids)),
+            "CLUSTER_ID": str(cluster_id),
+            "CLUSTER_COUNT": str(cluster_count),
+        })
+        for name, default in SHARED_BUDGETS.items():
+            total = float(os.getenv(name, default))
+            value = max(1.0, total / cluster_count)
+            self.env[name] = str(value) if "RATE" in name else str(int(value))
+        self.process = None
+        self.started_at = 0
+        self.restart_delay = 1
+        self.restart_at = 0
+
+    def start(self):
+        self.process = subprocess.Popen([sys.executable, "bot.py"], env=self.env)
+        self.started_at = time.time()
+        print(f"Cluster {self.cluster_id} started (pid {self.process.pid}, shards {self.shard_ids})")
+
+    def stop(self, timeout=30):
+        if self.process is None or self.process.poll() is not None:
+            return
+        self.process.terminate()
+        try:
+            self.process.wait(timeout)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+
+    def check(self, heartbeats, now):
+        """Restarts the cluster if it exited or one of its shards went quiet."""
+        if self.process.poll() is not None:
+            if self.restart_at == 0:
+                # Back off if it keeps dying right after starting
+                if now - self.started_at < MAX_RESTART_DELAY:
+                    self.restart_delay = min(self.restart_delay * 2, MAX_RESTART_DELAY)
+                else:
+                    self.restart_delay = 1
+                self.restart_at = now + self.restart_delay
+                print(f"Cluster {self.cluster_id} exited with {self.process.returncode}, "
+                      f"restarting in {self.restart_delay}s")
+            elif now >= self.restart_at:
+                self.restart_at = 0
+                self.start()
+            return
+
+        if now - self.started_at < HEALTH_TIMEOUT:
+            return
+        stale = [
+            shard_id for shard_id in self.shard_ids
+            if now - heartbeats.get(shard_id, 0) > HEALTH_TIMEOUT
+        ]
+        if stale:
+            print(f"Cluster {self.cluster_id}: no heartbeat from shards {stale}, restarting")
+            self.stop()
+            self.start()
+
+
+def read_heartbeats(path=DATABASE_FILE):
+    """shard_id -> last heartbeat time, as written by ClashBerryBot."""
+    try:
+        conn = sqlite3.connect(path, timeout=5)
+        try:
+            return dict(conn.execute("SELECT shard_id, updated_at FROM shard_health").fetchall())
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        return {}
+
+
+def main():
+    if not DISCORD_TOKEN:
+        print("DISCORD_TOKEN is not set properly in your environment variables.")
+        exit(1)
+    shard_count = SHARD_COUNT or recommended_shards(DISCORD_TOKEN)
+    cluster_count = max(1, min(CLUSTER_COUNT or os.cpu_count() or 1, shard_count))
+    clusters = [
+        Cluster(cluster_id, shard_ids, shard_count, cluster_count)
+        for cluster_id, shard_ids in enumerate(shard_ranges(shard_count, cluster_count))
+    ]
+    print(f"Running {shard_count} shards in {cluster_count} processes")
+
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    for cluster in clusters:
+        if stopping:
+            break
+        cluster.start()
+        # Staggered so every process isn't identifying at once
+        time.sleep(5)
+    while not stopping:
+        time.sleep(CHECK_INTERVAL)
+        if stopping:
+            break
+        heartbeats = read_heartbeats()
+        now = time.time()
+        for cluster in clusters:
+            cluster.check(heartbeats, now)
+
+    print("Stopping clusters")
+    for cluster in clusters:
+        if cluster.process is not None:
+            cluster.stop()
+
+
+if __name__ == "__main__":
+    main()
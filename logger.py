@@ -1,34 +1,155 @@
+import os
+import time
+import asyncio
 import discord
 
-LOG_CHANNEL_ID = 1387165662975103139  
-
-async def log_guild_join(bot: discord.Client, guild: discord.Guild):
-    """Logs when the bot joins a new server."""
-    log_channel = bot.get_channel(LOG_CHANNEL_ID)
-
-    if log_channel:
-        # Fetch the user who added the bot from audit logs
-        added_by = "Unknown"
-        async for entry in guild.audit_logs(limit=3, action=discord.AuditLogAction.bot_add):
-            if entry.target.id == bot.user.id:
-                added_by = entry.user.mention
-                break
-
-        # Build embed
-        embed = discord.Embed(
-            title=f"🍓 Added to {guild.name}",
-            description=(
-                f"ClashBerry bot added to new server **{guild.name}**.\n\n"
-                f"Server ID: `{guild.id}`\n\n"
-                f"Added by {added_by}"
-                
-            ),
-            color=discord.Color.green()
-        )
-        embed.set_footer(text=f"Now in Total {len(bot.guilds)} servers.")
-
-        # Set thumbnail to server icon
-        if guild.icon:
-            embed.set_thumbnail(url=guild.icon.url)
-
-        await log_channel.send(embed=embed)
\ No newline at end of file
+LOG_CHANNEL_ID = 1387165662975103139
+
+# Joins/leaves are posted as one digest per window, or sooner once this many pile up
+DIGEST_WINDOW = float(os.getenv("GUILD_LOG_WINDOW", "30"))
+DIGEST_MAX_EVENTS = int(os.getenv("GUILD_LOG_MAX_EVENTS", "20"))
+# Audit-log lookups for "Added by", at most this many at once
+AUDIT_LOG_CONCURRENCY = int(os.getenv("GUILD_LOG_AUDIT_CONCURRENCY", "2"))
+AUDIT_LOG_TIMEOUT = 10
+# Discord's embed description limit, minus some room
+DESCRIPTION_LIMIT = 4000
+
+
+class GuildEvent:
+    __slots__ = ("joined", "guild_id", "name", "member_count", "icon_url", "at", "added_by")
+
+    def __init__(self, guild, joined):
+        # Copied out now, the guild object is gone from the cache after a leave
+        self.joined = joined
+        self.guild_id = guild.id
+        self.name = guild.name
+        self.member_count = guild.member_count
+        self.icon_url = guild.icon.url if guild.icon else None
+        self.at = int(time.time())
+        self.added_by = None  # task resolving to a mention, joins only
+
+    def adder(self):
+        task = self.added_by
+        if task is None or not task.done() or task.cancelled() or task.exception() is not None:
+            return "Unknown"
+        return task.result()
+
+    def line(self):
+        if self.joined:
+            return (
+                f"🍓 Added to **{self.name}** (`{self.guild_id}`), {self.member_count or '?'} members, "
+                f"by {self.adder()} <t:{self.at}:R>"
+            )
+        return f"🥀 Removed from **{self.name}** (`{self.guild_id}`) <t:{self.at}:R>"
+
+
+class GuildLogDigest:
+    """Buffers guild joins and leaves and posts them to LOG_CHANNEL_ID as
+    digests, so a burst of joins costs a few messages instead of one message
+    and one audit-log fetch each.
+
+    "Added by" lookups run in the background with bounded concurrency and are
+    skipped in guilds where the bot can't view the audit log. A digest waits
+    briefly for them before it's sent.
+    """
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.events = []
+        self.posted = 0
+        self._semaphore = asyncio.Semaphore(AUDIT_LOG_CONCURRENCY)
+        self._timer = None
+        self._flush_lock = asyncio.Lock()
+        self._tasks = set()
+
+    def guild_joined(self, guild):
+        event = GuildEvent(guild, joined=True)
+        me = guild.me
+        if me is not None and me.guild_permissions.view_audit_log:
+            event.added_by = asyncio.create_task(self._find_adder(guild))
+        self._add(event)
+
+    def guild_left(self, guild):
+        self._add(GuildEvent(guild, joined=False))
+
+    def _add(self, event):
+        self.events.append(event)
+        if len(self.events) >= DIGEST_MAX_EVENTS:
+            self._flush_soon()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(DIGEST_WINDOW, self._flush_soon)
+
+    def _flush_soon(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        task = asyncio.create_task(self.flush())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _find_adder(self, guild):
+        async with self._semaphore:
+            try:
+                async for entry in guild.audit_logs(limit=3, action=discord.AuditLogAction.bot_add):
+                    if entry.target and entry.target.id == self.bot.user.id:
+                        return entry.user.mention if entry.user else "Unknown"
+            except discord.HTTPException:
+                pass
+        return "Unknown"
+
+    async def flush(self):
+        async with self._flush_lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            events, self.events = self.events, []
+            if not events:
+                return
+            lookups = [event.added_by for event in events if event.added_by is not None]
+            if lookups:
+                await asyncio.wait(lookups, timeout=AUDIT_LOG_TIMEOUT)
+
+            log_channel = self.bot.get_channel(LOG_CHANNEL_ID)
+            if log_channel is None:
+                return
+            try:
+                # One embed per message keeps each under the 6000 character total
+                for embed in self._embeds(events):
+                    await log_channel.send(embed=embed)
+            except discord.HTTPException as e:
+                print(f"Could not post guild log digest: {e}")
+                return
+            self.posted += len(events)
+
+    def _embeds(self, events):
+        footer = f"Now in Total {len(self.bot.guilds)} servers."
+        if len(events) == 1 and events[0].joined:
+            # A lone join keeps the detailed embed
+            event = events[0]
+            embed = discord.Embed(
+                title=f"🍓 Added to {event.name}",
+                description=(
+                    f"ClashBerry bot added to new server **{event.name}**.\n\n"
+                    f"Server ID: `{event.guild_id}`\n\n"
+                    f"Added by {event.adder()}"
+                ),
+                color=discord.Color.green()
+            )
+            if event.icon_url:
+                embed.set_thumbnail(url=event.icon_url)
+            embed.set_footer(text=footer)
+            return [embed]
+
+        joins = sum(1 for event in events if event.joined)
+        title = f"🍓 {joins} joined, {len(events) - joins} left"
+        color = discord.Color.green() if joins >= len(events) - joins else discord.Color.red()
+        embeds = []
+        description = ""
+        for line in (event.line() for event in events):
+            if len(description) + len(line) + 1 > DESCRIPTION_LIMIT:
+                embeds.append(discord.Embed(title=title, description=description, color=color))
+                description = ""
+            description += line + "\n"
+        embeds.append(discord.Embed(title=title, description=description, color=color))
+        embeds[-1].set_footer(text=footer)
+        return embeds
@@ -0,0 +1,190 @@
+import time
+import bisect
+import asyncio
+import functools
+from datetime import datetime, timezone
+
+# Seconds, from a cached lookup up to a slow API call or Discord round trip
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+# Discord drops autocomplete responses sent later than this after the keystroke
+AUTOCOMPLETE_DEADLINE = 3.0
+LOOP_LAG_INTERVAL = 0.5
+
+# name -> metric, re-registering a name (e.g. on extension reload) replaces it
+REGISTRY = {}
+
+
+def _format_labels(names, values, extra=""):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Metric:
+    """Base for the Prometheus metric types below.
+
+    Values are plain dict entries updated without locks: every update and
+    the /metrics handler run on the event loop thread, so the hot paths pay
+    one dict lookup and an add.
+    """
+
+    type = None
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        REGISTRY[name] = self
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+    def samples(self):
+        raise NotImplementedError
+
+    def _read(self, fn):
+        """(labels, value) pairs from a scrape-time callback, which returns a
+        number, or {label tuple: number} for labelled metrics."""
+        try:
+            values = fn()
+        except Exception:
+            return []
+        return values.items() if isinstance(values, dict) else [((), values)]
+
+
+class Counter(Metric):
+    """Incremented with `inc`, or read from `fn` at scrape time for totals
+    that are already counted elsewhere (e.g. cache hits)."""
+
+    type = "counter"
+
+    def __init__(self, name, help, labels=(), fn=None):
+        super().__init__(name, help, labels)
+        self.fn = fn
+        self._values = {}
+
+    def inc(self, *labels, amount=1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self):
+        items = self._read(self.fn) if self.fn is not None else list(self._values.items())
+        for labels, value in items:
+            yield f"{self.name}{_format_labels(self.labels, labels)} {value}"
+
+
+class Gauge(Metric):
+    """A value that is set directly, or read from `fn` at scrape time."""
+
+    type = "gauge"
+
+    def __init__(self, name, help, labels=(), fn=None):
+        super().__init__(name, help, labels)
+        self.fn = fn
+        self._values = {}
+
+    def set(self, value, *labels):
+        self._values[labels] = value
+
+    def get(self, *labels):
+        return self._values.get(labels)
+
+    def samples(self):
+        items = self._read(self.fn) if self.fn is not None else list(self._values.items())
+        for labels, value in items:
+            if value is not None:
+                yield f"{self.name}{_format_labels(self.labels, labels)} {value}"
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+        self._series = {}  # labels -> [bucket counts..., +Inf count, sum]
+
+    def observe(self, value, *labels):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [0] * (len(self.buckets) + 2)
+        series[bisect.bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def samples(self):
+        for labels, series in list(self._series.items()):
+            series = list(series)
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), series):
+                cumulative += count
+                le = _format_labels(self.labels, labels, f'le="{bound}"')
+                yield f"{self.name}_bucket{le} {cumulative}"
+            label_text = _format_labels(self.labels, labels)
+            yield f"{self.name}_sum{label_text} {series[-1]}"
+            yield f"{self.name}_count{label_text} {cumulative}"
+
+
+def render():
+    """Every registered metric in the Prometheus text exposition format."""
+    return "\n".join(metric.render() for metric in list(REGISTRY.values())) + "\n"
+
+
+COMMAND_LATENCY = Histogram(
+    "clashberry_command_seconds", "Slash command handling time, defer to last followup", ("command",)
+)
+COMMANDS = Counter("clashberry_commands_total", "Slash commands handled", ("command", "outcome"))
+AUTOCOMPLETE_LATENCY = Histogram(
+    "clashberry_autocomplete_seconds", "Autocomplete callback time", ("command",)
+)
+AUTOCOMPLETE_MISSES = Counter(
+    "clashberry_autocomplete_deadline_misses_total",
+    "Autocomplete results ready after Discord's response deadline", ("command",)
+)
+API_LATENCY = Histogram(
+    "clashberry_api_request_seconds", "Clash of Clans API request time until headers", ("endpoint",)
+)
+API_RESPONSES = Counter(
+    "clashberry_api_responses_total", "Clash of Clans API responses", ("endpoint", "status")
+)
+STORE_LATENCY = Histogram(
+    "clashberry_store_seconds", "Link store and state file operation time", ("store", "op")
+)
+LOOP_LAG = Gauge("clashberry_event_loop_lag_seconds", "Last measured event loop scheduling lag")
+LOOP_LAG_HISTOGRAM = Histogram(
+    "clashberry_event_loop_lag_histogram_seconds", "Event loop scheduling lag"
+)
+
+
+def track_autocomplete(fn):
+    """Wraps an autocomplete callback to time it and count deadline misses."""
+
+    @functools.wraps(fn)
+    async def wrapper(interaction, current):
+        start = time.perf_counter()
+        try:
+            return await fn(interaction, current)
+        finally:
+            command = interaction.command.qualified_name if interaction.command else "unknown"
+            AUTOCOMPLETE_LATENCY.observe(time.perf_counter() - start, command)
+            age = (datetime.now(timezone.utc) - interaction.created_at).total_seconds()
+            if age > AUTOCOMPLETE_DEADLINE:
+                AUTOCOMPLETE_MISSES.inc(command)
+
+    return wrapper
+
+
+async def monitor_loop_lag(interval=LOOP_LAG_INTERVAL):
+    """Sleeps `interval` in a loop, anything beyond it is time the loop was busy."""
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        lag = max(0.0, loop.time() - start - interval)
+        LOOP_LAG.set(lag)
+        LOOP_LAG_HISTOGRAM.observe(lag)
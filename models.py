@@ -0,0 +1,177 @@
+import sys
+import calendar
+import time
+from collections import namedtuple
+
+try:
+    import orjson
+    loads = orjson.loads
+except ImportError:
+    import json
+    loads = json.loads
+
+# (name, level, max_level), shared by troops, spells, heroes and equipment
+Unit = namedtuple("Unit", "name level max_level")
+WarMember = namedtuple("WarMember", "tag name map_position attacks")
+
+
+def parse_time(value):
+    """API timestamps look like 20240101T120000.000Z, returns epoch seconds."""
+    if not value:
+        return None
+    return calendar.timegm(time.strptime(value.split(".")[0], "%Y%m%dT%H%M%S"))
+
+
+def units(items):
+    # Unit names repeat across every player, intern them so they're stored once
+    return tuple(
+        Unit(sys.intern(u.get("name", "?")), u.get("level", "?"), u.get("maxLevel", "?"))
+        for u in items
+    )
+
+
+def approx_size(obj):
+    """Rough resident size of a model, used for cache and view memory budgets."""
+    size = sys.getsizeof(obj)
+    if isinstance(obj, tuple):
+        size += sum(approx_size(item) for item in obj if not isinstance(item, (int, float)))
+    elif hasattr(obj, "__slots__"):
+        size += sum(approx_size(getattr(obj, name)) for name in obj.__slots__)
+    return size
+
+
+class Player:
+    __slots__ = (
+        "tag", "name", "town_hall", "exp_level", "trophies", "clan_name", "league_name",
+        "league_icon", "troops", "spells", "heroes", "hero_equipment", "fingerprint"
+    )
+
+    def __init__(self, tag, name, town_hall, exp_level, trophies, clan_name, league_name,
+                 league_icon, troops, spells, heroes, hero_equipment):
+        self.tag = tag
+        self.name = name
+        self.town_hall = town_hall
+        self.exp_level = exp_level
+        self.trophies = trophies
+        self.clan_name = clan_name
+        self.league_name = league_name
+        self.league_icon = league_icon
+        self.troops = troops
+        self.spells = spells
+        self.heroes = heroes
+        self.hero_equipment = hero_equipment
+        # Changes whenever anything we display changes, used to key rendered embeds
+        self.fingerprint = hash((
+            tag, name, town_hall, exp_level, trophies, clan_name, league_name,
+            league_icon, troops, spells, heroes, hero_equipment
+        ))
+
+    @classmethod
+    def from_dict(cls, data):
+        league = data.get("league") or {}
+        return cls(
+            tag=data.get("tag", "?"),
+            name=data.get("name", "?"),
+            town_hall=data.get("townHallLevel", "?"),
+            exp_level=data.get("expLevel", "?"),
+            trophies=data.get("trophies", "?"),
+            clan_name=(data.get("clan") or {}).get("name", "None"),
+            league_name=league.get("name"),
+            league_icon=(league.get("iconUrls") or {}).get("medium"),
+            troops=units(data.get("troops", ())),
+            spells=units(data.get("spells", ())),
+            heroes=units(data.get("heroes", ())),
+            hero_equipment=units(data.get("heroEquipment", ())),
+        )
+
+    @classmethod
+    def from_bytes(cls, body):
+        return cls.from_dict(loads(body))
+
+
+class Clan:
+    __slots__ = ("tag", "name", "level", "members", "type", "points", "war_wins", "location_name", "badge_url")
+
+    def __init__(self, tag, name, level, members, type, points, war_wins, location_name, badge_url):
+        self.tag = tag
+        self.name = name
+        self.level = level
+        self.members = members
+        self.type = type
+        self.points = points
+        self.war_wins = war_wins
+        self.location_name = location_name
+        self.badge_url = badge_url
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            tag=data.get("tag", "?"),
+            name=data.get("name", "?"),
+            level=data.get("clanLevel", "?"),
+            members=data.get("members", "?"),
+            type=data.get("type", "?"),
+            points=data.get("clanPoints", "?"),
+            war_wins=data.get("warWins", "?"),
+            location_name=(data.get("location") or {}).get("name", "None"),
+            badge_url=(data.get("badgeUrls") or {}).get("large"),
+        )
+
+    @classmethod
+    def from_bytes(cls, body):
+        return cls.from_dict(loads(body))
+
+
+class WarClan:
+    __slots__ = ("tag", "name", "stars", "attacks", "destruction", "members")
+
+    def __init__(self, tag, name, stars, attacks, destruction, members):
+        self.tag = tag
+        self.name = name
+        self.stars = stars
+        self.attacks = attacks
+        self.destruction = destruction
+        self.members = members
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            tag=data.get("tag", "?"),
+            name=data.get("name", "?"),
+            stars=data.get("stars", "?"),
+            attacks=data.get("attacks", 0),
+            destruction=data.get("destructionPercentage", 0),
+            members=tuple(
+                WarMember(m.get("tag"), m.get("name", "?"), m.get("mapPosition", 0), len(m.get("attacks", ())))
+                for m in data.get("members", ())
+            ),
+        )
+
+
+class War:
+    __slots__ = ("state", "team_size", "attacks_per_member", "start_time", "end_time", "clan", "opponent")
+
+    def __init__(self, state, team_size, attacks_per_member, start_time, end_time, clan, opponent):
+        self.state = state
+        self.team_size = team_size
+        self.attacks_per_member = attacks_per_member
+        self.start_time = start_time
+        self.end_time = end_time
+        self.clan = clan
+        self.opponent = opponent
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            state=data.get("state", "?"),
+            team_size=data.get("teamSize", "?"),
+            attacks_per_member=data.get("attacksPerMember", 2),
+            start_time=parse_time(data.get("startTime")),
+            end_time=parse_time(data.get("endTime")),
+            clan=WarClan.from_dict(data.get("clan") or {}),
+            opponent=WarClan.from_dict(data.get("opponent") or {}),
+        )
+
+    @classmethod
+    def from_bytes(cls, body):
+        return cls.from_dict(loads(body))
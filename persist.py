@@ -0,0 +1,210 @@
+import os
+import json
+import time
+import asyncio
+from contextlib import asynccontextmanager, contextmanager
+
+from metrics import STORE_LATENCY
+
+try:
+    import fcntl
+except ImportError:  # Windows, where only one process runs anyway
+    fcntl = None
+
+FLUSH_DELAY = float(os.getenv("STATE_FLUSH_DELAY", "2"))
+
+_state_files = []
+
+
+def atomic_write(path, text):
+    """Writes to a temp file, fsyncs it and renames it over `path`, so a crash
+    leaves either the old file or the new one, never a truncated one."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+@contextmanager
+def file_lock(path):
+    """Exclusive lock on `path`.lock, held across processes of a cluster."""
+    if fcntl is None:
+        yield
+        return
+    with open(f"{path}.lock", "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def merge_write(path, updates_json, deleted, replace=False):
+    """Writes this process's changed keys into the file under the file lock.
+
+    Other processes of a cluster own other keys (e.g. other guilds), so the
+    file is re-read and only the keys in `updates_json` and `deleted` are
+    applied on top of it, unless `replace` is set and the whole file belongs
+    to this process.
+    """
+    with file_lock(path):
+        data = {}
+        if not replace:
+            try:
+                with open(path, "r") as f:
+                    data = json.load(f)
+            except (FileNotFoundError, json.JSONDecodeError):
+                pass
+            if not isinstance(data, dict):
+                data = {}
+        for key in deleted:
+            data.pop(key, None)
+        data.update(json.loads(updates_json))
+        atomic_write(path, json.dumps(data))
+
+
+class KeyedLocks:
+    """One asyncio.Lock per key, dropped again once nobody holds or waits on it."""
+
+    def __init__(self):
+        self._locks = {}  # key -> [lock, users]
+
+    @asynccontextmanager
+    async def hold(self, key):
+        entry = self._locks.get(key)
+        if entry is None:
+            entry = self._locks[key] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._locks[key]
+
+
+class JsonStateFile:
+    """A dict persisted to a JSON file with write-behind.
+
+    Changes are made in memory and `mark_dirty(key)` schedules one debounced
+    flush, which runs in an executor and replaces the file atomically. Only
+    the marked keys are merged into what's on disk, so cluster processes can
+    share a file as long as each writes its own keys; `mark_dirty()` with no
+    key writes the whole dict. Use `lock(key)` around read-modify-write
+    cycles that await in between.
+    """
+
+    def __init__(self, path, delay=FLUSH_DELAY):
+        self.path = path
+        self.delay = delay
+        start = time.perf_counter()
+        self.data = self._load()
+        STORE_LATENCY.observe(time.perf_counter() - start, os.path.basename(path), "read")
+        self.locks = KeyedLocks()
+        self._dirty = False
+        self._dirty_keys = set()
+        self._dirty_all = False
+        self._timer = None
+        self._flush_lock = None
+        _state_files.append(self)
+
+    def _load(self):
+        try:
+            with open(self.path, "r") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return {}
+        except json.JSONDecodeError as e:
+            # Keep the broken file for recovery instead of silently overwriting it
+            os.replace(self.path, f"{self.path}.corrupt")
+            print(f"Could not parse {self.path} ({e}), moved it to {self.path}.corrupt")
+            return {}
+        return data if isinstance(data, dict) else {}
+
+    def lock(self, key):
+        return self.locks.hold(key)
+
+    def get(self, key, default=None):
+        return self.data.get(key, default)
+
+    def set(self, key, value):
+        self.data[key] = value
+        self.mark_dirty(key)
+
+    def pop(self, key, default=None):
+        value = self.data.pop(key, default)
+        self.mark_dirty(key)
+        return value
+
+    def mark_dirty(self, *keys):
+        self._dirty = True
+        if keys:
+            self._dirty_keys.update(keys)
+        else:
+            self._dirty_all = True
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # No event loop (e.g. a script), write straight away
+            merge_write(self.path, *self._take_changes())
+            return
+        if self._timer is None:
+            self._timer = loop.call_later(self.delay, self._flush_later)
+
+    def _take_changes(self):
+        """Snapshot of the pending changes as merge_write() arguments."""
+        if self._dirty_all:
+            changes = (json.dumps(self.data), (), True)
+        else:
+            keys = self._dirty_keys
+            changes = (
+                json.dumps({key: self.data[key] for key in keys if key in self.data}),
+                [key for key in keys if key not in self.data],
+                False
+            )
+        self._dirty = False
+        self._dirty_keys = set()
+        self._dirty_all = False
+        return changes
+
+    def _flush_later(self):
+        self._timer = None
+        asyncio.ensure_future(self.flush())
+
+    async def flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        async with self._flush_lock:
+            if not self._dirty:
+                return
+            # Serialise on the loop so the snapshot is consistent, write off it
+            keys = () if self._dirty_all else tuple(self._dirty_keys)
+            changes = self._take_changes()
+            loop = asyncio.get_running_loop()
+            start = time.perf_counter()
+            try:
+                await loop.run_in_executor(None, merge_write, self.path, *changes)
+                STORE_LATENCY.observe(time.perf_counter() - start, os.path.basename(self.path), "write")
+            except OSError as e:
+                print(f"Error saving {self.path}: {e}")
+                # Retry the same keys, or the whole file if that's what failed
+                self.mark_dirty(*keys)
+
+    async def close(self):
+        """Flushes and stops tracking the file, for state owned by an extension
+        that is being unloaded. The reloaded module reads it back from disk."""
+        await self.flush()
+        if self in _state_files:
+            _state_files.remove(self)
+
+
+async def flush_all():
+    """Flushes every state file, called on shutdown."""
+    for state_file in _state_files:
+        await state_file.flush()
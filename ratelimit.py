@@ -0,0 +1,112 @@
+import time
+import heapq
+import asyncio
+import itertools
+
+# Priority classes, lower value is served first
+INTERACTIVE = 0  # slash commands, autocomplete and ticket modals
+BACKGROUND = 1   # pollers and reminders
+BULK = 2         # migrations, backfills and other batch jobs
+
+
+class QueueFull(Exception):
+    """Raised when the scheduler sheds a request instead of queueing it."""
+
+
+class RequestScheduler:
+    """Token bucket in front of the API with a priority queue for waiters.
+
+    The refill rate drops on 429/503 responses and creeps back up on
+    successes. Retry-After pauses every request until the window passes.
+    """
+
+    def __init__(self, rate=25.0, burst=25, max_queue=200, min_rate=1.0, clock=time.monotonic):
+        self.max_rate = rate
+        self.rate = rate
+        self.min_rate = min_rate
+        self.burst = burst
+        self.max_queue = max_queue
+        self.clock = clock
+        self.tokens = float(burst)
+        self.paused_until = 0.0
+        self.shed = 0
+        self._backoff = 0.0
+        self._updated = clock()
+        self._queue = []  # (priority, seq, future)
+        self._seq = itertools.count()
+        self._worker = None
+
+    @property
+    def queue_depth(self):
+        return len(self._queue)
+
+    def _refill(self, now):
+        elapsed = now - self._updated
+        if elapsed > 0:
+            self.tokens = min(self.burst, self.tokens + elapsed * self.rate)
+            self._updated = now
+
+    async def acquire(self, priority=INTERACTIVE):
+        now = self.clock()
+        self._refill(now)
+        if not self._queue and now >= self.paused_until and self.tokens >= 1:
+            self.tokens -= 1
+            return
+
+        if len(self._queue) >= self.max_queue:
+            self._shed(priority)
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._queue, (priority, next(self._seq), future))
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.ensure_future(self._run())
+        await future
+
+    def _shed(self, priority):
+        # Drop the newest request of the lowest queued priority if the
+        # incoming one outranks it, otherwise refuse the incoming one
+        worst = max(self._queue)
+        if worst[0] <= priority:
+            self.shed += 1
+            raise QueueFull("API request queue is full")
+        self._queue.remove(worst)
+        heapq.heapify(self._queue)
+        if not worst[2].done():
+            worst[2].set_exception(QueueFull("Request shed for higher priority work"))
+        self.shed += 1
+
+    async def _run(self):
+        while self._queue:
+            priority, _, future = self._queue[0]
+            if future.done():
+                heapq.heappop(self._queue)
+                continue
+            now = self.clock()
+            if now < self.paused_until:
+                await asyncio.sleep(self.paused_until - now)
+                continue
+            self._refill(now)
+            if self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                continue
+            heapq.heappop(self._queue)
+            self.tokens -= 1
+            future.set_result(None)
+
+    def backoff(self, retry_after=None):
+        """Called on 429/503: pause all requests and halve the refill rate."""
+        if retry_after is None:
+            self._backoff = min(max(1.0, self._backoff * 2), 60.0)
+            delay = self._backoff
+        else:
+            delay = retry_after
+        self.paused_until = max(self.paused_until, self.clock() + delay)
+        self.rate = max(self.min_rate, self.rate / 2)
+        # No tokens accrue while paused
+        self.tokens = 0.0
+        self._updated = self.paused_until
+
+    def success(self):
+        self._backoff = 0.0
+        if self.rate < self.max_rate:
+            self.rate = min(self.max_rate, self.rate + 0.5)
@@ -0,0 +1,138 @@
+import time
+import heapq
+import asyncio
+import discord
+
+from coc_api import ApiUnavailable
+from persist import JsonStateFile
+from ratelimit import BACKGROUND
+from war_poller import war_channels, war_id
+
+REMINDER_SETTINGS_FILE = "war_reminder_settings.json"
+REMINDERS_FILE = "war_reminders.json"
+
+# guild_id -> [hours before war end], set with /warreminder
+reminder_settings = JsonStateFile(REMINDER_SETTINGS_FILE)
+
+MAX_MENTIONS_LENGTH = 1800
+
+
+class ReminderScheduler:
+    """Pings linked users who still have attacks left N hours before war end.
+
+    Every pending reminder lives in one min-heap persisted to disk, and a
+    single task sleeps until the earliest one is due, so idle cost doesn't grow
+    with the number of reminders. Wars are fed in by the WarPoller.
+    """
+
+    def __init__(self, bot, path=REMINDERS_FILE):
+        self.bot = bot
+        self.sent = 0
+        # {"pending": [[due, guild_id, clan_tag, war_id, hours], ...]}
+        self.state = JsonStateFile(path)
+        self._heap = [tuple(item) for item in self.state.get("pending", [])]
+        heapq.heapify(self._heap)
+        self._keys = {item[1:] for item in self._heap}
+        self._wakeup = None
+        self._task = None
+        self._tasks = set()
+
+    @property
+    def pending(self):
+        return len(self._heap)
+
+    def start(self):
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def _save(self):
+        self.state.data["pending"] = self._heap
+        self.state.mark_dirty()
+
+    def schedule(self, due, guild_id, clan_tag, current_war, hours):
+        key = (guild_id, clan_tag, current_war, hours)
+        if key in self._keys:
+            return
+        self._keys.add(key)
+        heapq.heappush(self._heap, (due,) + key)
+        self._save()
+        if self._heap[0][0] == due and self._wakeup is not None:
+            self._wakeup.set()
+
+    def on_war(self, tag, war):
+        """WarPoller listener: schedules this guild's reminders for the war."""
+        if war is None or war.state not in ("preparation", "inWar") or not war.end_time:
+            return
+        now = time.time()
+        current_war = war_id(war)
+        for guild_id in self.bot.war_poller.local_guilds(tag):
+            for hours in reminder_settings.get(str(guild_id), []):
+                due = war.end_time - hours * 3600
+                if due > now:
+                    self.schedule(due, guild_id, tag, current_war, hours)
+
+    async def _run(self):
+        await self.bot.wait_until_ready()
+        while True:
+            if self._heap:
+                delay = self._heap[0][0] - time.time()
+            else:
+                delay = None
+            if delay is None or delay > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+                continue
+
+            due, guild_id, clan_tag, current_war, hours = heapq.heappop(self._heap)
+            self._keys.discard((guild_id, clan_tag, current_war, hours))
+            self._save()
+            task = asyncio.create_task(self._fire(guild_id, clan_tag, current_war, hours))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _fire(self, guild_id, clan_tag, current_war, hours):
+        # Settings may have changed or the clan been unlinked since this was scheduled
+        if hours not in reminder_settings.get(str(guild_id), []):
+            return
+        if guild_id not in self.bot.war_poller.local_guilds(clan_tag):
+            return
+        channel = self.bot.get_channel(war_channels.get(str(guild_id)) or 0)
+        if channel is None:
+            return
+        try:
+            war = await self.bot.coc.get_clan_war(clan_tag, priority=BACKGROUND)
+        except ApiUnavailable:
+            return
+        if war is None or war.state != "inWar" or war_id(war) != current_war:
+            return
+
+        user_ids = set()
+        for member in war.clan.members:
+            if member.attacks < war.attacks_per_member:
+                user_ids |= self.bot.links.players.owners(member.tag)
+        if not user_ids:
+            return
+
+        header = f"⚔️ **{hours}h left** in the war against **{war.opponent.name}**, you still have attacks left!\n"
+        chunks = [""]
+        for user_id in sorted(user_ids):
+            mention = f"<@{user_id}> "
+            if len(chunks[-1]) + len(mention) > MAX_MENTIONS_LENGTH:
+                chunks.append("")
+            chunks[-1] += mention
+        try:
+            for chunk in chunks:
+                await channel.send(header + chunk)
+        except discord.HTTPException as e:
+            print(f"Could not send war reminder for {clan_tag} in {channel.id}: {e}")
+            return
+        self.sent += 1
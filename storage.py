@@ -0,0 +1,251 @@
+import os
+import json
+import time
+import sqlite3
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from tag_index import TagIndex
+from persist import KeyedLocks
+from metrics import STORE_LATENCY
+
+DATABASE_FILE = os.getenv("DATABASE_FILE", "clashberry.db")
+
+# How long replayable link changes are kept, a process that is down for
+# longer rebuilds its indexes from the tables on startup anyway
+CHANGE_RETENTION = 3600
+
+# Legacy whole-file JSON stores, imported once by migrate_json_files()
+LINKED_CLANS_FILE = "linked_clans.json"
+LINKED_PLAYERS_FILE = "linked_players.json"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS clan_links (
+    guild_id INTEGER NOT NULL,
+    tag TEXT NOT NULL,
+    name TEXT NOT NULL,
+    PRIMARY KEY (guild_id, tag)
+);
+CREATE INDEX IF NOT EXISTS clan_links_guild ON clan_links (guild_id);
+CREATE INDEX IF NOT EXISTS clan_links_tag ON clan_links (tag);
+
+CREATE TABLE IF NOT EXISTS player_links (
+    user_id INTEGER NOT NULL,
+    tag TEXT NOT NULL,
+    name TEXT NOT NULL,
+    PRIMARY KEY (user_id, tag)
+);
+CREATE INDEX IF NOT EXISTS player_links_user ON player_links (user_id);
+CREATE INDEX IF NOT EXISTS player_links_tag ON player_links (tag);
+
+-- Link writes, replayed by the other processes of a cluster (see LinkStore.shared)
+CREATE TABLE IF NOT EXISTS link_changes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    op TEXT NOT NULL,
+    owner_id INTEGER NOT NULL,
+    tag TEXT NOT NULL,
+    name TEXT NOT NULL,
+    pid INTEGER NOT NULL,
+    created_at REAL NOT NULL
+);
+
+-- Heartbeats from every shard, read by launcher.py
+CREATE TABLE IF NOT EXISTS shard_health (
+    shard_id INTEGER PRIMARY KEY,
+    cluster_id INTEGER NOT NULL,
+    pid INTEGER NOT NULL,
+    latency REAL,
+    guilds INTEGER NOT NULL,
+    updated_at REAL NOT NULL
+);
+"""
+
+
+def migrate_json_files(conn, clans_file=LINKED_CLANS_FILE, players_file=LINKED_PLAYERS_FILE):
+    """Imports the old JSON link files, then renames them so it only runs once."""
+    for path, table, owner in ((clans_file, "clan_links", "guild_id"), (players_file, "player_links", "user_id")):
+        if not os.path.exists(path):
+            continue
+        try:
+            with open(path, "r") as f:
+                data = json.load(f)
+        except json.JSONDecodeError as e:
+            # e.g. truncated by a crash mid-write, keep it for recovery and start without it
+            os.replace(path, f"{path}.corrupt")
+            print(f"Could not parse {path} ({e}), moved it to {path}.corrupt")
+            continue
+        rows = [
+            (int(owner_id), link["tag"].upper(), link.get("name", "?"))
+            for owner_id, links in data.items()
+            for link in links
+        ]
+        with conn:
+            conn.executemany(f"INSERT OR IGNORE INTO {table} ({owner}, tag, name) VALUES (?, ?, ?)", rows)
+        os.replace(path, path + ".migrated")
+        print(f"Migrated {len(rows)} rows from {path} into {table}")
+
+
+class LinkStore:
+    """Clan and player links in SQLite (WAL mode).
+
+    All queries run on one dedicated worker thread that owns the connection,
+    so command handlers never block the event loop on disk I/O. Reads are
+    served from the in-memory `clans` and `players` indexes, which open()
+    builds once at startup and every add/remove keeps up to date.
+
+    With `shared` set (one of several cluster processes on the same file),
+    every write is also logged to link_changes and `sync_changes()` replays
+    the other processes' writes into the indexes.
+    """
+
+    def __init__(self, path=DATABASE_FILE, shared=False):
+        self.path = path
+        self.shared = shared
+        self._pid = os.getpid()
+        self._last_change = 0
+        self._conn = None
+        self.clans = TagIndex()    # guild_id -> linked clans
+        self.players = TagIndex()  # user_id -> linked accounts
+        # Serialises writes per owner so the database and the indexes agree
+        self._locks = KeyedLocks()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="link-store")
+
+    def _connection(self):
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(SCHEMA)
+            self._conn = conn
+            migrate_json_files(conn)
+        return self._conn
+
+    async def _run(self, fn, *args):
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+        try:
+            return await loop.run_in_executor(self._executor, fn, *args)
+        finally:
+            STORE_LATENCY.observe(time.perf_counter() - start, "links", fn.__name__.lstrip("_"))
+
+    def _query(self, sql, params=()):
+        return self._connection().execute(sql, params).fetchall()
+
+    def _write_many(self, sql, rows):
+        conn = self._connection()
+        with conn:
+            conn.executemany(sql, rows)
+
+    def _write_link(self, sql, params, change):
+        """Runs a link write, logging it in the same transaction when shared."""
+        conn = self._connection()
+        with conn:
+            count = conn.execute(sql, params).rowcount
+            if count and self.shared:
+                conn.execute(
+                    "INSERT INTO link_changes (kind, op, owner_id, tag, name, pid, created_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    change + (self._pid, time.time())
+                )
+        return count
+
+    def _read_changes(self, after):
+        conn = self._connection()
+        rows = conn.execute(
+            "SELECT id, kind, op, owner_id, tag, name, pid FROM link_changes WHERE id > ? ORDER BY id",
+            (after,)
+        ).fetchall()
+        with conn:
+            conn.execute("DELETE FROM link_changes WHERE created_at < ?", (time.time() - CHANGE_RETENTION,))
+        return rows
+
+    async def open(self):
+        if self.shared:
+            rows = await self._run(self._query, "SELECT COALESCE(MAX(id), 0) FROM link_changes")
+            self._last_change = rows[0][0]
+        clan_rows = await self._run(self._query, "SELECT guild_id, tag, name FROM clan_links ORDER BY rowid")
+        player_rows = await self._run(self._query, "SELECT user_id, tag, name FROM player_links ORDER BY rowid")
+        self.clans = TagIndex()
+        self.players = TagIndex()
+        for guild_id, tag, name in clan_rows:
+            self.clans.add(guild_id, tag, name)
+        for user_id, tag, name in player_rows:
+            self.players.add(user_id, tag, name)
+
+    async def sync_changes(self):
+        """Applies links added or removed by other cluster processes."""
+        rows = await self._run(self._read_changes, self._last_change)
+        for change_id, kind, op, owner_id, tag, name, pid in rows:
+            self._last_change = change_id
+            if pid == self._pid:
+                continue
+            index = self.clans if kind == "clan" else self.players
+            if op == "add":
+                index.add(owner_id, tag, name)
+            else:
+                index.remove(owner_id, tag)
+        return len(rows)
+
+    async def report_health(self, cluster_id, shards):
+        """Upserts one heartbeat row per (shard_id, latency, guilds)."""
+        now = time.time()
+        rows = [
+            (shard_id, cluster_id, self._pid, latency, guilds, now)
+            for shard_id, latency, guilds in shards
+        ]
+        await self._run(
+            self._write_many,
+            "INSERT OR REPLACE INTO shard_health (shard_id, cluster_id, pid, latency, guilds, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)", rows
+        )
+
+    async def close(self):
+        if self._conn is not None:
+            await self._run(self._conn.close)
+            self._conn = None
+        self._executor.shutdown(wait=False)
+
+    def clans_for_guild(self, guild_id):
+        return self.clans.links(guild_id)
+
+    async def add_clan(self, guild_id, tag, name):
+        """Returns False if the clan was already linked to the guild."""
+        async with self._locks.hold(("clan", int(guild_id))):
+            count = await self._run(
+                self._write_link, "INSERT OR IGNORE INTO clan_links (guild_id, tag, name) VALUES (?, ?, ?)",
+                (int(guild_id), tag, name), ("clan", "add", int(guild_id), tag, name)
+            )
+            self.clans.add(guild_id, tag, name)
+        return count > 0
+
+    async def remove_clan(self, guild_id, tag):
+        async with self._locks.hold(("clan", int(guild_id))):
+            count = await self._run(
+                self._write_link, "DELETE FROM clan_links WHERE guild_id = ? AND tag = ?",
+                (int(guild_id), tag), ("clan", "remove", int(guild_id), tag, "")
+            )
+            self.clans.remove(guild_id, tag)
+        return count > 0
+
+    def players_for_user(self, user_id):
+        return self.players.links(user_id)
+
+    async def add_player(self, user_id, tag, name):
+        """Returns False if the account was already linked to the user."""
+        async with self._locks.hold(("player", int(user_id))):
+            count = await self._run(
+                self._write_link, "INSERT OR IGNORE INTO player_links (user_id, tag, name) VALUES (?, ?, ?)",
+                (int(user_id), tag, name), ("player", "add", int(user_id), tag, name)
+            )
+            self.players.add(user_id, tag, name)
+        return count > 0
+
+    async def remove_player(self, user_id, tag):
+        async with self._locks.hold(("player", int(user_id))):
+            count = await self._run(
+                self._write_link, "DELETE FROM player_links WHERE user_id = ? AND tag = ?",
+                (int(user_id), tag), ("player", "remove", int(user_id), tag, "")
+            )
+            self.players.remove(user_id, tag)
+        return count > 0
@@ -0,0 +1,53 @@
+class TagIndex:
+    """In-memory name/tag lookup grouped by owner (a guild's clans or a user's
+    accounts), so autocomplete never touches the database."""
+
+    def __init__(self):
+        self._owners = {}  # owner_id -> [(tag, name, search_tag, search_name)]
+        self._by_tag = {}  # tag -> {owner_id}, the reverse lookup
+
+    def __len__(self):
+        return sum(len(entries) for entries in self._owners.values())
+
+    def add(self, owner_id, tag, name):
+        entries = self._owners.setdefault(int(owner_id), [])
+        if any(entry[0] == tag for entry in entries):
+            return
+        entries.append((tag, name, tag.lower().lstrip("#"), name.lower()))
+        self._by_tag.setdefault(tag, set()).add(int(owner_id))
+
+    def remove(self, owner_id, tag):
+        owner_id = int(owner_id)
+        entries = [entry for entry in self._owners.get(owner_id, []) if entry[0] != tag]
+        if entries:
+            self._owners[owner_id] = entries
+        else:
+            self._owners.pop(owner_id, None)
+        owners = self._by_tag.get(tag)
+        if owners is not None:
+            owners.discard(owner_id)
+            if not owners:
+                del self._by_tag[tag]
+
+    def tags(self):
+        return list(self._by_tag)
+
+    def owners(self, tag):
+        """Every guild/user that linked `tag`."""
+        return set(self._by_tag.get(tag, ()))
+
+    def links(self, owner_id):
+        return [{"name": name, "tag": tag} for tag, name, _, _ in self._owners.get(int(owner_id), [])]
+
+    def search(self, owner_id, current, limit=25):
+        """Top matches for `current`, prefix matches on tag or name ranked first."""
+        query = current.lower().strip().lstrip("#")
+        prefix, substring = [], []
+        for tag, name, search_tag, search_name in self._owners.get(int(owner_id), []):
+            if search_tag.startswith(query) or search_name.startswith(query):
+                prefix.append({"name": name, "tag": tag})
+                if len(prefix) >= limit:
+                    break
+            elif query in search_tag or query in search_name:
+                substring.append({"name": name, "tag": tag})
+        return (prefix + substring)[:limit]
@@ -1,27 +1,15 @@
 import os
-import json
+import asyncio
 import discord
-import aiohttp
+from contextlib import asynccontextmanager
+
+from coc_api import normalize_tag, ApiUnavailable, API_BUSY_MESSAGE
+from persist import JsonStateFile
+from transcripts import TranscriptArchiver
 
-COC_API_TOKEN = os.getenv("API_TOKEN")
 STAFF_ROLES_FILE = "staff_roles.json"
-staff_roles = {}
-
-def load_staff_roles():
-    global staff_roles
-    try:
-        with open(STAFF_ROLES_FILE, "r") as f:
-            data = json.load(f)
-            if isinstance(data, dict):
-                staff_roles = data
-            else:
-                staff_roles = {}
-    except (FileNotFoundError, json.JSONDecodeError):
-        staff_roles = {}
-
-def save_staff_roles():
-    with open(STAFF_ROLES_FILE, "w") as f:
-        json.dump(staff_roles, f, indent=2)
+# guild_id -> {"staff_role": role_id, "category_id": category_id, "archive_channel_id": channel_id}
+staff_roles = JsonStateFile(STAFF_ROLES_FILE)
 
 def get_staff_role(guild):
     staff_obj = staff_roles.get(str(guild.id))
@@ -38,40 +26,181 @@ def get_category_id(guild):
         return staff_obj.get("category_id")
     return None
 
-load_staff_roles()
-
-async def get_coc_player(player_tag):
-    url = f"https://cocproxy.royaleapi.dev/v1/players/{player_tag.replace('#', '%23')}"
-    headers = {"Authorization": f"Bearer {COC_API_TOKEN}"}
-    async with aiohttp.ClientSession() as session:
-        async with session.get(url, headers=headers) as resp:
-            if resp.status == 200:
-                return await resp.json()
-            else:
-                return None
-
-async def show_profile(interaction, player_data):
-    th_level = player_data.get("townHallLevel", "?")
-    name = player_data.get("name", "?")
-    tag = player_data.get("tag", "?")
-    exp_level = player_data.get("expLevel", "?")
-    trophies = player_data.get("trophies", "?")
-    clan = player_data.get("clan", {}).get("name", "None")
+def get_archive_channel(guild):
+    staff_obj = staff_roles.get(str(guild.id))
+    if staff_obj and isinstance(staff_obj, dict):
+        channel_id = staff_obj.get("archive_channel_id")
+        if channel_id:
+            return guild.get_channel(channel_id)
+    return None
+
+def ticket_channel_name(user):
+    return f"ticket-{user.name.lower().replace('.', '')}"
+
+class TicketRegistry:
+    """Open tickets by (guild_id, user_id), so duplicate checks are a dict
+    lookup instead of a scan over every text channel."""
+
+    def __init__(self, path, backfill_path):
+        # guild_id -> {user_id: {"channel_id": channel_id, "player_tag": tag}}
+        self.state = JsonStateFile(path)
+        # guild_id -> True once backfill() is done, or the channel ids it checked so far
+        self.backfilled = JsonStateFile(backfill_path)
+        self._by_channel = {
+            ticket["channel_id"]: (guild_id, user_id)
+            for guild_id, tickets in self.state.data.items()
+            for user_id, ticket in tickets.items()
+        }
+
+    def get(self, guild_id, user_id):
+        return self.state.get(str(guild_id), {}).get(str(user_id))
+
+    def owner(self, channel_id):
+        """(user_id, ticket) for a ticket channel, None if it isn't one."""
+        owner = self._by_channel.get(channel_id)
+        if owner is None:
+            return None
+        guild_id, user_id = owner
+        return user_id, self.state.get(guild_id, {}).get(user_id)
+
+    def get_channel(self, guild, user_id):
+        """The user's open ticket channel, dropping the entry if it is gone."""
+        ticket = self.get(guild.id, user_id)
+        if ticket is None:
+            return None
+        channel = guild.get_channel(ticket["channel_id"])
+        if channel is None:
+            self.remove_channel(ticket["channel_id"])
+        return channel
+
+    def add(self, guild_id, user_id, channel_id, player_tag=None):
+        self.state.data.setdefault(str(guild_id), {})[str(user_id)] = {
+            "channel_id": channel_id,
+            "player_tag": player_tag
+        }
+        self._by_channel[channel_id] = (str(guild_id), str(user_id))
+        self.state.mark_dirty(str(guild_id))
+
+    def remove_channel(self, channel_id):
+        owner = self._by_channel.pop(channel_id, None)
+        if owner is None:
+            return None
+        guild_id, user_id = owner
+        tickets = self.state.data.get(guild_id, {})
+        ticket = tickets.pop(user_id, None)
+        if not tickets:
+            self.state.data.pop(guild_id, None)
+        self.state.mark_dirty(guild_id)
+        return ticket
+
+    def reconcile(self, guild):
+        """Drops tickets whose channel was deleted while the bot was offline."""
+        for ticket in list(self.state.get(str(guild.id), {}).values()):
+            if guild.get_channel(ticket["channel_id"]) is None:
+                self.remove_channel(ticket["channel_id"])
+
+    async def backfill(self, guild, bot_user_id, budget):
+        """Registers ticket channels opened before the registry existed. The
+        applicant is the first user mentioned in the bot's pinned welcome
+        message, their player tag wasn't recorded then.
+
+        Makes at most `budget` pins() calls and returns what's left of it.
+        Checked channels are remembered in `backfilled` until the guild is
+        done, so no channel is fetched twice across restarts.
+        """
+        guild_key = str(guild.id)
+        checked = self.backfilled.get(guild_key, [])
+        if checked is True:
+            return budget
+        checked = set(checked)
+        for channel in guild.text_channels:
+            if not channel.name.startswith("ticket-") or channel.id in self._by_channel or channel.id in checked:
+                continue
+            if budget <= 0:
+                # Carry on from here on the next start
+                self.backfilled.set(guild_key, sorted(checked))
+                return budget
+            budget -= 1
+            checked.add(channel.id)
+            try:
+                pins = await channel.pins()
+            except discord.HTTPException:
+                continue
+            for message in pins:
+                if message.author.id == bot_user_id and message.raw_mentions:
+                    user_id = message.raw_mentions[0]
+                    if self.get(guild.id, user_id) is None:
+                        self.add(guild.id, user_id, channel.id)
+                    break
+        self.backfilled.set(guild_key, True)
+        return budget
+
+TICKETS_FILE = "tickets.json"
+TICKETS_BACKFILL_FILE = "tickets_backfill.json"
+# pins() calls per start for backfilling pre-registry tickets
+BACKFILL_BUDGET = 50
+tickets = TicketRegistry(TICKETS_FILE, TICKETS_BACKFILL_FILE)
+transcripts = TranscriptArchiver()
+
+# Ticket channels created at once per guild, Discord rate limits channel
+# creation per guild so a recruitment rush has to queue anyway
+TICKET_CREATE_CONCURRENCY = int(os.getenv("TICKET_CREATE_CONCURRENCY", "2"))
+
+class TicketCreationQueue:
+    """Per-guild queue for ticket channel creation, plus the set of users
+    whose ticket is being created so a second confirm is turned away."""
+
+    def __init__(self, concurrency=TICKET_CREATE_CONCURRENCY):
+        self.concurrency = concurrency
+        self._guilds = {}  # guild_id -> [semaphore, creating or waiting]
+        self._users = set()  # (guild_id, user_id)
+
+    def claim(self, guild_id, user_id):
+        """False if this user's ticket is already in progress."""
+        key = (guild_id, user_id)
+        if key in self._users:
+            return False
+        self._users.add(key)
+        return True
+
+    def release(self, guild_id, user_id):
+        self._users.discard((guild_id, user_id))
+
+    def ahead(self, guild_id):
+        """How many applications a new one would wait behind."""
+        entry = self._guilds.get(guild_id)
+        return max(0, entry[1] - self.concurrency + 1) if entry else 0
+
+    @asynccontextmanager
+    async def slot(self, guild_id):
+        entry = self._guilds.get(guild_id)
+        if entry is None:
+            entry = self._guilds[guild_id] = [asyncio.Semaphore(self.concurrency), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._guilds[guild_id]
+
+ticket_queue = TicketCreationQueue()
+
+async def show_profile(interaction, player):
     embed = discord.Embed(
-        title=f"{name} ({tag})",
+        title=f"{player.name} ({player.tag})",
         color=discord.Color.green(),
         description=(
-            f"TH Level: **{th_level}**\n"
-            f"Exp Level: **{exp_level}**\n"
-            f"Trophies: **{trophies}**\n"
-            f"Clan: **{clan}**"
+            f"TH Level: **{player.town_hall}**\n"
+            f"Exp Level: **{player.exp_level}**\n"
+            f"Trophies: **{player.trophies}**\n"
+            f"Clan: **{player.clan_name}**"
         )
     )
-    if "league" in player_data and "iconUrls" in player_data["league"]:
-        icon = player_data["league"]["iconUrls"].get("medium")
-        if icon:
-            embed.set_thumbnail(url=icon)
-    await interaction.response.send_message(embed=embed, ephemeral=True)
+    if player.league_icon:
+        embed.set_thumbnail(url=player.league_icon)
+    await interaction.followup.send(embed=embed, ephemeral=True)
 
 class TicketPanelView(discord.ui.View):
     def __init__(self):
@@ -80,12 +209,7 @@ class TicketPanelView(discord.ui.View):
     @discord.ui.button(label="Apply now", style=discord.ButtonStyle.success, custom_id="apply_now")
     async def apply_now(self, interaction: discord.Interaction, button: discord.ui.Button):
         normalized_username = interaction.user.name.lower().replace('.', '')
-        channel_name = f"ticket-{normalized_username}"
-        found_channel = None
-        for channel in interaction.guild.text_channels:
-            if channel.name == channel_name:
-                found_channel = channel
-                break
+        found_channel = tickets.get_channel(interaction.guild, interaction.user.id)
         if found_channel:
             embed = discord.Embed(
                 description=f"You have already opened a ticket: {found_channel.mention}",
@@ -113,18 +237,20 @@ class TagModal(discord.ui.Modal, title="Enter In-game Tag"):
         self.username = username
 
     async def on_submit(self, interaction: discord.Interaction):
-        player_tag = self.tag.value.replace(" ", "").upper().replace("O", "0")
-        if not player_tag.startswith("#"):
-            player_tag = "#" + player_tag
+        player_tag = normalize_tag(self.tag.value)
 
         await interaction.response.defer(ephemeral=True, thinking=True)
-        player_data = await get_coc_player(player_tag)
-        if player_data is None:
+        try:
+            player = await interaction.client.coc.get_player(player_tag)
+        except ApiUnavailable:
+            await interaction.followup.send(API_BUSY_MESSAGE, ephemeral=True)
+            return
+        if player is None:
             await interaction.followup.send("😓 Invalid player tag.", ephemeral=True)
             return
 
-        name = player_data.get("name", "?")
-        tag = player_data.get("tag", "?")
+        name = player.name
+        tag = player.tag
 
         embed = discord.Embed(
             title="{name} ({tag})",
@@ -135,13 +261,13 @@ class TagModal(discord.ui.Modal, title="Enter In-game Tag"):
         )
         await interaction.followup.send(
             embed=embed,
-            view=ConfirmAccountView(player_data, self.staff_role_id, self.username),        ephemeral=True
+            view=ConfirmAccountView(player.tag, self.staff_role_id, self.username),        ephemeral=True
         )
 
 class ConfirmAccountView(discord.ui.View):
-    def __init__(self, player_data, staff_role_id, username):
+    def __init__(self, player_tag, staff_role_id, username):
         super().__init__(timeout=None)
-        self.player_data = player_data
+        self.player_tag = player_tag
         self.staff_role_id = staff_role_id
         self.username = username
 
@@ -149,18 +275,25 @@ class ConfirmAccountView(discord.ui.View):
     async def confirm_account(self, interaction: discord.Interaction, button: discord.ui.Button):
         guild = interaction.guild
         user = interaction.user
-        channel_name = f"ticket-{user.name.lower()}"
-        found_channel = None
-        for channel in guild.text_channels:
-            if channel.name == channel_name:
-                found_channel = channel
-                break
 
         staff_role = get_staff_role(guild)
         if not staff_role:
             await interaction.response.send_message("Staff role is not set up correctly for this server. Please run the /setup_ticket command again.", ephemeral=True)
             return
 
+        # A double click, or a second confirm from another modal, lands here
+        if not ticket_queue.claim(guild.id, user.id):
+            await interaction.response.send_message("⏳ Your ticket is already being created.", ephemeral=True)
+            return
+        try:
+            await self.create_ticket(interaction, staff_role)
+        finally:
+            ticket_queue.release(guild.id, user.id)
+
+    async def create_ticket(self, interaction, staff_role):
+        guild = interaction.guild
+        user = interaction.user
+        found_channel = tickets.get_channel(guild, user.id)
         if found_channel:
             embed = discord.Embed(
                 description=f"You already have a ticket: {found_channel.mention}",
@@ -172,15 +305,34 @@ class ConfirmAccountView(discord.ui.View):
                 await interaction.followup.send(embed=embed, ephemeral=True)
             return
 
-        category_id = get_category_id(guild)
-        category = guild.get_channel(category_id) if category_id else None
-
-        ticket_channel = await guild.create_text_channel(
-            name=channel_name,
-            category=category,
-            reason="Clan application ticket"
+        # Answer straight away, channel creation may have to wait its turn
+        ahead = ticket_queue.ahead(guild.id)
+        queued_embed = discord.Embed(
+            description="⏳ Creating your ticket..." + (f" {ahead} application(s) ahead of you." if ahead else ""),
+            color=discord.Color.yellow()
         )
+        self.children[0].disabled = True
+        try:
+            await interaction.response.edit_message(embed=queued_embed, content=None, view=self)
+        except discord.errors.NotFound:
+            pass
 
+        category_id = get_category_id(guild)
+        category = guild.get_channel(category_id) if category_id else None
+        try:
+            async with ticket_queue.slot(guild.id):
+                ticket_channel = await guild.create_text_channel(
+                    name=ticket_channel_name(user),
+                    category=category,
+                    reason="Clan application ticket"
+                )
+        except discord.HTTPException as e:
+            print(f"Could not create ticket channel in {guild.id}: {e}")
+            await self.finish(interaction, discord.Embed(
+                description="😓 Could not create your ticket channel, please ask staff to check my permissions.",
+                color=discord.Color.red()
+            ))
+            return
         staff_mention = staff_role.mention if staff_role else "@Staff"
         embed = discord.Embed(
             title="Clan Application",
@@ -190,40 +342,135 @@ class ConfirmAccountView(discord.ui.View):
             ),
             color=discord.Color.green()
         )
-        ticket_message = await ticket_channel.send(
-            content=f"{user.mention} {staff_mention}",
-            embed=embed,
-            view=TicketActionsView(user.name.lower(), staff_role.id if staff_role else None, self.player_data)
-        )
-        await ticket_message.pin()
+        actions_view = TicketActionsView(user.id, self.player_tag)
+        try:
+            tickets.add(guild.id, user.id, ticket_channel.id, self.player_tag)
+            ticket_message = await ticket_channel.send(
+                content=f"{user.mention} {staff_mention}",
+                embed=embed,
+                view=actions_view
+            )
+        except discord.HTTPException as e:
+            # A ticket without its buttons is no use, and would block the applicant's retry
+            print(f"Could not send ticket message in {ticket_channel.id}: {e}")
+            tickets.remove_channel(ticket_channel.id)
+            try:
+                await ticket_channel.delete(reason="Ticket setup failed")
+            except discord.HTTPException:
+                pass
+            await self.finish(interaction, discord.Embed(
+                description="😓 Could not set up your ticket channel, please try again or ask staff to check my permissions.",
+                color=discord.Color.red()
+            ))
+            return
+        finally:
+            # Clicks are routed through the dynamic items, the view needn't stay alive
+            actions_view.stop()
 
         confirm_embed = discord.Embed(
             title="✅ Ticket Created",
             description=f"Your ticket has been created: {ticket_channel.mention}",
             color=discord.Color.green()
         )
-        self.children[0].disabled = True
+        # The pin and the confirmation don't depend on each other
+        pinned, finished = await asyncio.gather(
+            ticket_message.pin(),
+            self.finish(interaction, confirm_embed),
+            return_exceptions=True
+        )
+        if isinstance(pinned, Exception):
+            print(f"Could not pin ticket message in {ticket_channel.id}: {pinned}")
+        if isinstance(finished, Exception):
+            print(f"Could not confirm ticket {ticket_channel.id} to {user.id}: {finished}")
+
+    async def finish(self, interaction, embed):
         try:
-            await interaction.response.edit_message(embed=confirm_embed, content=None, view=self)
+            await interaction.edit_original_response(embed=embed, content=None, view=self)
         except discord.errors.NotFound:
-            await interaction.followup.send(embed=confirm_embed, ephemeral=True)
+            await interaction.followup.send(embed=embed, ephemeral=True)
+
+class TicketProfileButton(discord.ui.DynamicItem[discord.ui.Button], template=r"ticket:profile:(?P<user_id>[0-9]+):(?P<tag>[0-9A-Z]+)"):
+    """'Player Account' button. Its state lives in the custom_id, so it keeps
+    working after a restart and nothing is held in memory per ticket."""
+
+    def __init__(self, user_id, player_tag):
+        super().__init__(
+            discord.ui.Button(
+                label="Player Account",
+                style=discord.ButtonStyle.primary,
+                custom_id=f"ticket:profile:{user_id}:{player_tag.lstrip('#')}"
+            )
+        )
+        self.user_id = user_id
+        self.player_tag = player_tag
 
-class TicketActionsView(discord.ui.View):
-    def __init__(self, username, staff_role_id, player_data):
-        super().__init__(timeout=None)
-        self.username = username
-        self.staff_role_id = staff_role_id
-        self.player_data = player_data
+    @classmethod
+    async def from_custom_id(cls, interaction, item, match):
+        return cls(int(match["user_id"]), "#" + match["tag"])
+
+    async def callback(self, interaction: discord.Interaction):
+        if interaction.user.id != self.user_id:
+            await interaction.response.send_message("Only the ticket creator can view the profile.", ephemeral=True)
+            return
+        await interaction.response.defer(ephemeral=True, thinking=True)
+        try:
+            player = await interaction.client.coc.get_player(self.player_tag)
+        except ApiUnavailable:
+            await interaction.followup.send(API_BUSY_MESSAGE, ephemeral=True)
+            return
+        if player is None:
+            await interaction.followup.send("😓 Could not load this player.", ephemeral=True)
+            return
+        await show_profile(interaction, player)
+
+class LegacyTicketProfileButton(discord.ui.DynamicItem[discord.ui.Button], template=r"profile_button"):
+    """'Player Account' button of tickets opened before TicketProfileButton,
+    whose custom_id carries no owner or tag. Both come from the registry, and
+    tickets backfilled from those days have no tag."""
+
+    def __init__(self):
+        super().__init__(
+            discord.ui.Button(label="Player Account", style=discord.ButtonStyle.primary, custom_id="profile_button")
+        )
 
-    @discord.ui.button(label="Player Account", style=discord.ButtonStyle.primary, custom_id="profile_button")
-    async def profile(self, interaction: discord.Interaction, button: discord.ui.Button):
-        if interaction.user.name.lower() != self.username:
+    @classmethod
+    async def from_custom_id(cls, interaction, item, match):
+        return cls()
+
+    async def callback(self, interaction: discord.Interaction):
+        owner = tickets.owner(interaction.channel.id)
+        if owner is not None and str(interaction.user.id) != owner[0]:
             await interaction.response.send_message("Only the ticket creator can view the profile.", ephemeral=True)
             return
-        await show_profile(interaction, self.player_data)
+        player_tag = owner[1].get("player_tag") if owner and owner[1] else None
+        if not player_tag:
+            await interaction.response.send_message(
+                "😓 The player account isn't available for this ticket, please use /player instead.", ephemeral=True
+            )
+            return
+        await interaction.response.defer(ephemeral=True, thinking=True)
+        try:
+            player = await interaction.client.coc.get_player(player_tag)
+        except ApiUnavailable:
+            await interaction.followup.send(API_BUSY_MESSAGE, ephemeral=True)
+            return
+        if player is None:
+            await interaction.followup.send("😓 Could not load this player.", ephemeral=True)
+            return
+        await show_profile(interaction, player)
 
-    @discord.ui.button(label="Delete Ticket", style=discord.ButtonStyle.danger, custom_id="delete_ticket")
-    async def delete_ticket(self, interaction: discord.Interaction, button: discord.ui.Button):
+class TicketDeleteButton(discord.ui.DynamicItem[discord.ui.Button], template=r"delete_ticket"):
+    # Same custom_id as before, so buttons in existing tickets work again
+    def __init__(self):
+        super().__init__(
+            discord.ui.Button(label="Delete Ticket", style=discord.ButtonStyle.danger, custom_id="delete_ticket")
+        )
+
+    @classmethod
+    async def from_custom_id(cls, interaction, item, match):
+        return cls()
+
+    async def callback(self, interaction: discord.Interaction):
         staff_role = get_staff_role(interaction.guild)
         if not staff_role:
             await interaction.response.send_message("Staff role is not set up. Please run the /setup_ticket command again.", ephemeral=True)
@@ -243,13 +490,34 @@ class TicketActionsView(discord.ui.View):
             ephemeral=True
         )
 
+class TicketActionsView(discord.ui.View):
+    def __init__(self, user_id, player_tag):
+        super().__init__(timeout=None)
+        self.add_item(TicketProfileButton(user_id, player_tag))
+        self.add_item(TicketDeleteButton())
+
 class DeleteConfirmView(discord.ui.View):
     def __init__(self):
         super().__init__(timeout=None)
 
     @discord.ui.button(label="Confirm Delete", style=discord.ButtonStyle.danger)
     async def confirm(self, interaction: discord.Interaction, button: discord.ui.Button):
-        await interaction.channel.delete()
+        channel = interaction.channel
+        if transcripts.is_archiving(channel.id):
+            await interaction.response.send_message("⏳ This ticket is already being closed.", ephemeral=True)
+            return
+
+        owner = tickets.owner(channel.id)
+        user_id, ticket = owner if owner else (None, None)
+        player_tag = ticket.get("player_tag") if ticket else None
+        tickets.remove_channel(channel.id)
+        await interaction.response.edit_message(
+            content="📁 Saving the transcript, this channel will be deleted shortly.",
+            embed=None,
+            view=None
+        )
+        # Runs in the background, the channel is deleted once the transcript is saved
+        transcripts.archive_and_delete(channel, user_id, player_tag, get_archive_channel(interaction.guild))
 
 class PanelEditModal(discord.ui.Modal, title="Setup Ticket Panel Embed"):
     title_in = discord.ui.TextInput(label="Embed Title", required=True, max_length=256)
@@ -333,7 +601,28 @@ class PreviewPanelSendOnlyView(discord.ui.View):
         )
         self.stop()
 
-def setup(bot):
+async def setup(bot):
+    async def on_guild_channel_delete(channel):
+        tickets.remove_channel(channel.id)
+
+    backfill_budget = BACKFILL_BUDGET
+
+    async def on_ready():
+        nonlocal backfill_budget
+        for guild in bot.guilds:
+            tickets.reconcile(guild)
+        # Shared across guilds and reconnects, the rest waits for the next start
+        for guild in bot.guilds:
+            if backfill_budget <= 0:
+                break
+            backfill_budget = await tickets.backfill(guild, bot.user.id, backfill_budget)
+
+    bot.add_listener(on_guild_channel_delete)
+    bot.add_listener(on_ready)
+    bot.add_dynamic_items(TicketProfileButton, LegacyTicketProfileButton, TicketDeleteButton)
+    # Persistent panel, so the Apply button keeps working across restarts
+    bot.add_view(TicketPanelView())
+
     @bot.tree.command(
         name="setup_ticket",
         description="Setup the clan application ticket panel"
@@ -341,23 +630,24 @@ def setup(bot):
     @discord.app_commands.describe(
         staff_role="Select role for staff",
         channel="Channel to send the ticket panel (optional)",
-        category="Category for ticket channels (optional)"
+        category="Category for ticket channels (optional)",
+        archive_channel="Channel to post transcripts of deleted tickets (optional)"
     )
     async def setup_ticket_command(
         interaction: discord.Interaction,
         staff_role: discord.Role,
         channel: discord.TextChannel = None,
-        category: discord.CategoryChannel = None
+        category: discord.CategoryChannel = None,
+        archive_channel: discord.TextChannel = None
     ):
         await interaction.response.defer(ephemeral=True, thinking=True)
-        staff_roles[str(interaction.guild.id)] = {
-            "staff_role": staff_role.id,
-            "category_id": category.id if category else None
-        }
-        try:
-            save_staff_roles()
-        except Exception as e:
-            print(f"Error saving staff_roles: {e}")
+        guild_id = str(interaction.guild.id)
+        async with staff_roles.lock(guild_id):
+            staff_roles.set(guild_id, {
+                "staff_role": staff_role.id,
+                "category_id": category.id if category else None,
+                "archive_channel_id": archive_channel.id if archive_channel else None
+            })
 
         preview_embed = discord.Embed(
             title="Ticket Panel Title",
@@ -371,4 +661,54 @@ def setup(bot):
         )
         view = PreviewPanelEditOnlyView(staff_role.id, preview_embed, channel, category.id if category else None, msg.id, msg.channel.id)
         await msg.edit(view=view)
-  
+
+    @bot.tree.command(
+        name="ticket_transcripts",
+        description="List archived ticket transcripts of a member or player"
+    )
+    @discord.app_commands.describe(
+        member="Applicant to look up (optional)",
+        player_tag="Player tag to look up (optional)"
+    )
+    async def ticket_transcripts_command(
+        interaction: discord.Interaction,
+        member: discord.Member = None,
+        player_tag: str = None
+    ):
+        staff_role = get_staff_role(interaction.guild)
+        if not interaction.user.guild_permissions.administrator and (staff_role is None or staff_role not in interaction.user.roles):
+            await interaction.response.send_message("😓 Only staff can view ticket transcripts.", ephemeral=True)
+            return
+
+        entries = transcripts.find(
+            interaction.guild.id,
+            user_id=member.id if member else None,
+            player_tag=normalize_tag(player_tag) if player_tag else None
+        )
+        if not entries:
+            await interaction.response.send_message("No archived transcripts found.", ephemeral=True)
+            return
+
+        lines = []
+        for entry in entries[:15]:
+            where = f"[transcript]({entry['url']})" if entry["url"] else "kept on disk"
+            applicant = f"<@{entry['user_id']}>" if entry["user_id"] else "Unknown"
+            lines.append(
+                f"<t:{entry['archived_at']}:d> #{entry['channel']} {applicant} "
+                f"`{entry['player_tag'] or '?'}`, {entry['messages']} messages, {where}"
+            )
+        embed = discord.Embed(
+            title=f"📁 Ticket transcripts ({len(entries)})",
+            description="\n".join(lines),
+            color=discord.Color.blurple()
+        )
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
+
+async def teardown(bot):
+    # Commands and listeners are dropped by unload_extension, dynamic items are not
+    bot.remove_dynamic_items(TicketProfileButton, LegacyTicketProfileButton, TicketDeleteButton)
+    await transcripts.drain()
+    # A reload re-creates these from disk, so pending changes must be there first
+    for state_file in (staff_roles, tickets.state, tickets.backfilled, transcripts.index):
+        await state_file.close()
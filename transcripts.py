@@ -0,0 +1,159 @@
+import os
+import gzip
+import json
+import time
+import asyncio
+import discord
+
+from persist import JsonStateFile
+
+TRANSCRIPT_DIR = os.getenv("TRANSCRIPT_DIR", "transcripts")
+TRANSCRIPT_INDEX_FILE = "transcripts.json"
+# Tickets archived at once, each one pages through history and uploads a file
+TRANSCRIPT_CONCURRENCY = int(os.getenv("TRANSCRIPT_CONCURRENCY", "3"))
+# Level 6 is most of level 9's ratio for a fraction of the CPU
+COMPRESS_LEVEL = 6
+# Seconds to let running archives finish on shutdown or reload
+DRAIN_TIMEOUT = 30
+
+
+def message_record(message):
+    return {
+        "id": message.id,
+        "at": message.created_at.isoformat(),
+        "author_id": message.author.id,
+        "author": str(message.author),
+        "bot": message.author.bot,
+        "content": message.content,
+        "embeds": [embed.to_dict() for embed in message.embeds],
+        "attachments": [attachment.url for attachment in message.attachments],
+    }
+
+
+def _write_lines(file, lines):
+    file.write("".join(lines).encode())
+
+
+class TranscriptArchiver:
+    """Exports a ticket channel to a gzipped JSONL file before it's deleted.
+
+    History is read a page at a time and each page is compressed and written
+    off the event loop before the next is fetched, so memory doesn't grow with
+    the length of the ticket. The file is posted to the guild's archive
+    channel, if one is set, and indexed by guild with the user and player tag
+    so `find()` can list a user's past tickets.
+    """
+
+    def __init__(self, path=TRANSCRIPT_INDEX_FILE, directory=TRANSCRIPT_DIR, concurrency=TRANSCRIPT_CONCURRENCY):
+        # guild_id -> [{"user_id", "player_tag", "channel", "file", "messages", "archived_at", "url"}, ...]
+        self.index = JsonStateFile(path)
+        self.directory = directory
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._channels = set()
+        self._tasks = set()
+
+    def is_archiving(self, channel_id):
+        return channel_id in self._channels
+
+    def archive_and_delete(self, channel, user_id, player_tag, archive_channel=None):
+        """Archives `channel` in the background, then deletes it."""
+        self._channels.add(channel.id)
+        task = asyncio.create_task(self._archive_and_delete(channel, user_id, player_tag, archive_channel))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def _archive_and_delete(self, channel, user_id, player_tag, archive_channel):
+        try:
+            async with self._semaphore:
+                try:
+                    await self.archive(channel, user_id, player_tag, archive_channel)
+                except (discord.HTTPException, OSError) as e:
+                    # Staff asked for the ticket to go, so it goes without a transcript
+                    print(f"Could not archive ticket {channel.id}: {e}")
+            try:
+                await channel.delete(reason="Ticket closed")
+            except discord.NotFound:
+                pass
+        finally:
+            self._channels.discard(channel.id)
+
+    async def archive(self, channel, user_id, player_tag, archive_channel=None):
+        guild_id = str(channel.guild.id)
+        os.makedirs(os.path.join(self.directory, guild_id), exist_ok=True)
+        path = os.path.join(self.directory, guild_id, f"{channel.id}-{int(time.time())}.jsonl.gz")
+
+        loop = asyncio.get_running_loop()
+        count = 0
+        page = []
+        file = await loop.run_in_executor(None, lambda: gzip.open(path, "wb", compresslevel=COMPRESS_LEVEL))
+        try:
+            # history() fetches 100 messages per request, write each batch out as it arrives
+            async for message in channel.history(limit=None, oldest_first=True):
+                page.append(json.dumps(message_record(message)) + "\n")
+                if len(page) == 100:
+                    await loop.run_in_executor(None, _write_lines, file, page)
+                    count += len(page)
+                    page = []
+            if page:
+                await loop.run_in_executor(None, _write_lines, file, page)
+                count += len(page)
+        finally:
+            await loop.run_in_executor(None, file.close)
+
+        url = None
+        if archive_channel is not None:
+            try:
+                url = await self._post(archive_channel, channel, path, user_id, player_tag, count)
+            except discord.HTTPException as e:
+                print(f"Could not post transcript of {channel.id}: {e}")
+        entry = {
+            "user_id": str(user_id) if user_id else None,
+            "player_tag": player_tag,
+            "channel": channel.name,
+            "file": path,
+            "messages": count,
+            "archived_at": int(time.time()),
+            "url": url,
+        }
+        self.index.data.setdefault(guild_id, []).append(entry)
+        self.index.mark_dirty(guild_id)
+        return entry
+
+    async def _post(self, archive_channel, channel, path, user_id, player_tag, count):
+        """Uploads the transcript, returns a link to the message."""
+        applicant = f"<@{user_id}>" if user_id else "Unknown"
+        embed = discord.Embed(
+            title=f"📁 Transcript of #{channel.name}",
+            description=(
+                f"Applicant: {applicant}\n"
+                f"Player tag: `{player_tag or 'Unknown'}`\n"
+                f"Messages: {count}"
+            ),
+            color=discord.Color.blurple()
+        )
+        # Depends on the guild's boost level
+        if os.path.getsize(path) > archive_channel.guild.filesize_limit:
+            embed.set_footer(text="Too large to upload, kept on the bot's disk.")
+            message = await archive_channel.send(embed=embed)
+        else:
+            # discord.File reads from disk while uploading, the transcript isn't loaded whole
+            message = await archive_channel.send(
+                embed=embed,
+                file=discord.File(path, filename=os.path.basename(path))
+            )
+        return message.jump_url
+
+    def find(self, guild_id, user_id=None, player_tag=None):
+        """Archived transcripts of a guild, newest first, filtered by user and/or tag."""
+        entries = self.index.get(str(guild_id), [])
+        return [
+            entry for entry in reversed(entries)
+            if (user_id is None or entry["user_id"] == str(user_id))
+            and (player_tag is None or entry["player_tag"] == player_tag)
+        ]
+
+    async def drain(self, timeout=DRAIN_TIMEOUT):
+        """Waits for running archives to finish."""
+        if self._tasks:
+            await asyncio.wait(list(self._tasks), timeout=timeout)
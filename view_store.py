@@ -0,0 +1,41 @@
+from collections import OrderedDict
+
+
+class ViewStore:
+    """Keeps track of live views and caps them by count and estimated memory.
+
+    Views expire on their own idle timeout. Past either cap the least recently
+    used view is stopped, which also drops discord.py's reference to it.
+    """
+
+    def __init__(self, max_views=500, max_bytes=16 * 1024 * 1024):
+        self.max_views = max_views
+        self.max_bytes = max_bytes
+        self._views = OrderedDict()  # view -> estimated size in bytes
+        self.bytes = 0
+        self.evictions = 0
+
+    @property
+    def live(self):
+        return len(self._views)
+
+    def add(self, view, size):
+        self.discard(view)
+        self._views[view] = size
+        self.bytes += size
+        while len(self._views) > self.max_views or self.bytes > self.max_bytes:
+            oldest = next(iter(self._views))
+            if oldest is view:
+                break
+            self.discard(oldest)
+            oldest.stop()
+            self.evictions += 1
+
+    def touch(self, view):
+        if view in self._views:
+            self._views.move_to_end(view)
+
+    def discard(self, view):
+        size = self._views.pop(view, None)
+        if size is not None:
+            self.bytes -= size
@@ -0,0 +1,189 @@
+import os
+import time
+import zlib
+import heapq
+import asyncio
+import discord
+
+from coc_api import ApiUnavailable
+from persist import JsonStateFile
+from ratelimit import BACKGROUND
+
+WAR_CHANNELS_FILE = "war_channels.json"
+WAR_POSTS_FILE = "war_posts.json"
+
+# guild_id -> channel_id for live war embeds, set with /warchannel
+war_channels = JsonStateFile(WAR_CHANNELS_FILE)
+# guild_id -> {clan_tag: {"message_id": id, "war": war_id, "fingerprint": ...}}
+war_posts = JsonStateFile(WAR_POSTS_FILE)
+
+# Seconds between polls of one clan, by war state
+POLL_IN_WAR = float(os.getenv("WAR_POLL_IN_WAR", "60"))
+POLL_PREPARATION = float(os.getenv("WAR_POLL_PREPARATION", "900"))
+POLL_NOT_IN_WAR = float(os.getenv("WAR_POLL_NOT_IN_WAR", "3600"))
+# Share of the API budget the poller may use, in requests per second
+POLL_RATE = float(os.getenv("WAR_POLL_RATE", "5"))
+POLL_CONCURRENCY = int(os.getenv("WAR_POLL_CONCURRENCY", "8"))
+# How often newly linked or unlinked clans are picked up
+RESYNC_INTERVAL = 60
+
+
+def poll_interval(war, now):
+    if war is None or war.state in ("notInWar", "warEnded"):
+        return POLL_NOT_IN_WAR
+    if war.state == "preparation":
+        # Wake up in time for the battle day to start
+        if war.start_time:
+            return max(POLL_IN_WAR, min(POLL_PREPARATION, war.start_time - now))
+        return POLL_PREPARATION
+    return POLL_IN_WAR
+
+
+def war_id(war):
+    return f"{war.opponent.tag}:{war.start_time}"
+
+
+def war_fingerprint(war):
+    clan, opponent = war.clan, war.opponent
+    return (
+        f"{war.state}:{clan.stars}:{clan.attacks}:{clan.destruction}:"
+        f"{opponent.stars}:{opponent.attacks}:{opponent.destruction}"
+    )
+
+
+class WarPoller:
+    """Polls currentwar for every linked clan and keeps a live war embed up to
+    date in each guild's /warchannel.
+
+    Clans sit in a min-heap by next poll time. The interval depends on the war
+    state, first polls are staggered by tag, and polls are paced to POLL_RATE
+    at BACKGROUND priority so they never get ahead of user commands. Messages
+    are only edited when stars, attacks or state actually change. Only clans
+    linked in guilds on this process's shards are polled.
+    """
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.listeners = []  # callables(tag, war) run after every successful poll
+        self.polls = 0
+        self.updates = 0
+        self._queue = []  # (due, clan_tag)
+        self._scheduled = set()
+        self._tasks = set()
+        self._semaphore = None
+        self._task = None
+
+    def start(self):
+        if self._task is None:
+            self._semaphore = asyncio.Semaphore(POLL_CONCURRENCY)
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        for task in list(self._tasks):
+            task.cancel()
+
+    def local_guilds(self, tag):
+        """Guilds that linked `tag` and are on this process's shards."""
+        return [
+            guild_id for guild_id in self.bot.links.clans.owners(tag)
+            if self.bot.get_guild(guild_id) is not None
+        ]
+
+    def _sync(self, now):
+        tags = [tag for tag in self.bot.links.clans.tags() if self.local_guilds(tag)]
+        # Spread first polls so all clans never fire at once
+        span = max(POLL_IN_WAR, len(tags) / POLL_RATE)
+        for tag in tags:
+            if tag not in self._scheduled:
+                offset = zlib.crc32(tag.encode()) % int(span)
+                heapq.heappush(self._queue, (now + offset, tag))
+                self._scheduled.add(tag)
+
+    async def _run(self):
+        await self.bot.wait_until_ready()
+        next_sync = 0
+        while True:
+            now = time.time()
+            if now >= next_sync:
+                self._sync(now)
+                next_sync = now + RESYNC_INTERVAL
+            if not self._queue or self._queue[0][0] > now:
+                wake = min(next_sync, self._queue[0][0]) if self._queue else next_sync
+                await asyncio.sleep(max(0.1, wake - now))
+                continue
+
+            _, tag = heapq.heappop(self._queue)
+            if not self.local_guilds(tag):
+                # Unlinked (or the guild left) since it was scheduled
+                self._scheduled.discard(tag)
+                continue
+            await self._semaphore.acquire()
+            task = asyncio.create_task(self._poll(tag))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+            await asyncio.sleep(1 / POLL_RATE)
+
+    async def _poll(self, tag):
+        # A failed fetch is retried soon, a blip on war day mustn't freeze the embed for an hour
+        interval = POLL_IN_WAR
+        try:
+            war = await self.bot.coc.get_clan_war(tag, priority=BACKGROUND)
+            self.polls += 1
+            interval = poll_interval(war, time.time())
+            await self._publish(tag, war)
+            for listener in self.listeners:
+                listener(tag, war)
+        except ApiUnavailable:
+            pass
+        except Exception as e:
+            print(f"War poll for {tag} failed: {e}")
+        finally:
+            self._semaphore.release()
+            heapq.heappush(self._queue, (time.time() + interval, tag))
+
+    async def _publish(self, tag, war):
+        if war is None or war.state == "notInWar":
+            return
+        from commands.war import war_embed
+
+        current_war = war_id(war)
+        fingerprint = war_fingerprint(war)
+        embed = None
+        for guild_id in self.local_guilds(tag):
+            guild_key = str(guild_id)
+            channel_id = war_channels.get(guild_key)
+            if not channel_id:
+                continue
+            post = war_posts.get(guild_key, {}).get(tag)
+            if post and post["war"] == current_war and post["fingerprint"] == fingerprint:
+                continue
+            channel = self.bot.get_channel(channel_id)
+            if channel is None:
+                continue
+
+            embed = embed or war_embed(war)
+            message_id = None
+            try:
+                if post and post["war"] == current_war:
+                    try:
+                        await channel.get_partial_message(post["message_id"]).edit(embed=embed)
+                        message_id = post["message_id"]
+                    except discord.NotFound:
+                        pass
+                if message_id is None:
+                    message = await channel.send(embed=embed)
+                    message_id = message.id
+            except discord.HTTPException as e:
+                print(f"Could not post war update for {tag} in {channel_id}: {e}")
+                continue
+
+            war_posts.data.setdefault(guild_key, {})[tag] = {
+                "message_id": message_id,
+                "war": current_war,
+                "fingerprint": fingerprint
+            }
+            war_posts.mark_dirty(guild_key)
+            self.updates += 1
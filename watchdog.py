@@ -0,0 +1,118 @@
+import os
+import sys
+import time
+import threading
+import traceback
+from collections import Counter as Tally
+
+from metrics import Counter
+
+# A callback holding the loop longer than this gets its stack logged
+WATCHDOG_THRESHOLD = float(os.getenv("WATCHDOG_THRESHOLD", "0.25"))
+WATCHDOG_INTERVAL = 0.05
+PROFILE_INTERVAL = 0.01
+
+LOOP_STALLS = Counter("clashberry_event_loop_stalls_total", "Times the event loop was blocked past the watchdog threshold")
+
+
+def frame_stack(frame):
+    """Root-first list of "function (file:line)" entries for a frame."""
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    stack.reverse()
+    return stack
+
+
+class LoopWatchdog:
+    """Detects callbacks that block the event loop and logs what they were doing.
+
+    The loop stamps a heartbeat every WATCHDOG_INTERVAL from a call_later
+    chain. A daemon thread checks the stamp, and if the loop has missed it for
+    longer than the threshold it grabs the loop thread's current frame, which
+    is the code blocking it, and prints that stack once per stall.
+    """
+
+    def __init__(self, loop, threshold=WATCHDOG_THRESHOLD):
+        self.loop = loop
+        self.threshold = threshold
+        self.thread_id = threading.get_ident()
+        self.stalls = 0
+        self._beat = time.monotonic()
+        self._handle = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._heartbeat()
+            self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+
+    def _heartbeat(self):
+        self._beat = time.monotonic()
+        self._handle = self.loop.call_later(WATCHDOG_INTERVAL, self._heartbeat)
+
+    def _watch(self):
+        stalled_since = None
+        while not self._stop.wait(WATCHDOG_INTERVAL):
+            blocked = time.monotonic() - self._beat - WATCHDOG_INTERVAL
+            if blocked < self.threshold:
+                if stalled_since is not None:
+                    print(f"Event loop unblocked after {time.monotonic() - stalled_since:.2f}s")
+                    stalled_since = None
+                continue
+            if stalled_since is not None:
+                continue
+            stalled_since = self._beat
+            self.stalls += 1
+            # Metrics are only touched on the loop thread, it's counted once the loop is free
+            try:
+                self.loop.call_soon_threadsafe(LOOP_STALLS.inc)
+            except RuntimeError:  # loop already closed
+                pass
+            frame = sys._current_frames().get(self.thread_id)
+            stack = "".join(traceback.format_stack(frame)) if frame is not None else "  (no frame)\n"
+            print(f"Event loop blocked for {blocked:.2f}s, loop thread is at:\n{stack}", end="")
+
+
+class SamplingProfiler:
+    """Samples one thread's stack at a fixed interval and aggregates the samples
+    into collapsed stacks (one "frame;frame;frame count" line per unique stack),
+    the input format of flamegraph.pl and speedscope."""
+
+    def __init__(self, thread_id, interval=PROFILE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = 0
+        self.stacks = Tally()
+
+    def run(self, seconds):
+        """Blocks for `seconds` while sampling, call it from a worker thread."""
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.stacks[";".join(frame_stack(frame))] += 1
+                self.samples += 1
+            del frame
+            time.sleep(self.interval)
+        return self
+
+    def collapsed(self):
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def top_functions(self, limit=10):
+        """Functions by the number of samples they were on top of the stack."""
+        leaves = Tally()
+        for stack, count in self.stacks.items():
+            leaves[stack.rsplit(";", 1)[-1]] += count
+        return leaves.most_common(limit)